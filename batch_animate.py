@@ -0,0 +1,205 @@
+import json, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import TypedDict, Optional, Callable
+from create_gif import create_and_save_animation, get_array_template, get_frame_template, gif_palette
+from letterboxd_export import load_export
+from profiling import Profile
+
+# The settings for a batch, which can be given as a JSON file
+class BatchConfig(TypedDict):
+    output_dir: str
+    # .mp4 or .gif
+    output_format: str
+    # How many exports to render at once, defaulting to one per CPU
+    processes: Optional[int]
+    # The most memory each job's process can use, in megabytes, or None for
+    # no limit. A job that goes over fails rather than taking the machine down.
+    memory_limit_mb: Optional[int]
+    scale_image: int
+    target_duration_seconds: float
+    renderer: str
+
+DEFAULT_CONFIG: BatchConfig = {
+    'output_dir': 'animations',
+    'output_format': '.mp4',
+    'processes': None,
+    'memory_limit_mb': None,
+    'scale_image': 4,
+    'target_duration_seconds': 10,
+    'renderer': 'numpy',
+}
+
+class JobResult(TypedDict):
+    export: str
+    output: Optional[str]
+    seconds: float
+    diary_rows: int
+    frames_rendered: int
+    bytes_encoded: int
+    error: Optional[str]
+
+def load_config(config_file: Optional[str]) -> BatchConfig:
+    config = dict(DEFAULT_CONFIG)
+    if config_file is not None:
+        with open(config_file) as file:
+            config.update(json.load(file))
+    return config # type: ignore[return-value]
+
+# Where each worker says which export it's starting on, so that when a worker
+# dies the batch can tell which jobs were running
+_started_jobs = None
+
+# Runs once in each worker process. Caps its memory, then loads the fonts and
+# renders the frame chrome up front, so that every job the worker runs reuses
+# them instead of starting from scratch.
+def init_worker(config: BatchConfig, started_jobs=None):
+    global _started_jobs
+    _started_jobs = started_jobs
+    if config['memory_limit_mb'] is not None:
+        # Only available on Unix
+        import resource
+        limit = config['memory_limit_mb'] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    get_frame_template(config['scale_image'])
+    if config['renderer'] == 'numpy':
+        get_array_template(config['scale_image'])
+    if config['output_format'] == '.gif':
+        gif_palette(config['scale_image'])
+
+# The name of an export without its extension, e.g.
+# letterboxd-dado3212-2025-03-01-12-00-utc for a .zip straight from Letterboxd
+def export_name(export_path: str) -> str:
+    return os.path.splitext(os.path.basename(os.path.normpath(export_path)))[0]
+
+# Renders one export's animation. Runs in a worker process, and never raises,
+# so that one bad export doesn't stop the rest of the batch.
+def render_job(export_path: str, config: BatchConfig) -> JobResult:
+    start = time.perf_counter()
+    result: JobResult = {
+        'export': export_path,
+        'output': None,
+        'seconds': 0,
+        'diary_rows': 0,
+        'frames_rendered': 0,
+        'bytes_encoded': 0,
+        'error': None,
+    }
+    if _started_jobs is not None:
+        _started_jobs.put(export_path)
+    try:
+        export = load_export(export_path)
+        result['diary_rows'] = len(export['names'])
+        output_file = os.path.join(config['output_dir'], export_name(export_path) + config['output_format'])
+        # Turned on for its counters, but never written out
+        profile = Profile(os.devnull)
+        create_and_save_animation(
+            export,
+            profile,
+            target_duration_seconds=config['target_duration_seconds'],
+            scale_image=config['scale_image'],
+            # The batch already has a process per job
+            render_processes=1,
+            renderer=config['renderer'],
+            output_file=output_file,
+        )
+        result['output'] = output_file
+        result['frames_rendered'] = profile.counters.get('frames_rendered', 0)
+        result['bytes_encoded'] = profile.counters.get('bytes_encoded', 0)
+    except MemoryError:
+        result['error'] = f"went over the {config['memory_limit_mb']}MB memory limit"
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def worker_failed(export_path: str, error: BaseException) -> JobResult:
+    return {
+        'export': export_path,
+        'output': None,
+        'seconds': 0,
+        'diary_rows': 0,
+        'frames_rendered': 0,
+        'bytes_encoded': 0,
+        'error': f'worker failed: {error!r}',
+    }
+
+# Runs the jobs in a fresh pool, passing each result to record as it finishes.
+# Returns the jobs that didn't finish because a worker died, which breaks the
+# whole pool.
+def run_pool(
+    export_paths: list[str],
+    config: BatchConfig,
+    processes: Optional[int],
+    started_jobs,
+    record: Callable[[JobResult], None],
+) -> tuple[list[str], Optional[BaseException]]:
+    unfinished: list[str] = []
+    broken: Optional[BaseException] = None
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(config, started_jobs)) as executor:
+        futures = {executor.submit(render_job, export_path, config): export_path for export_path in export_paths}
+        for future in as_completed(futures):
+            try:
+                record(future.result())
+            except BrokenProcessPool as error:
+                unfinished.append(futures[future])
+                broken = error
+    return unfinished, broken
+
+# Renders the animation for every export (a .zip or a folder) across a pool of
+# worker processes, then writes a summary of how it went
+def render_batch(export_paths: list[str], config: BatchConfig, summary_file: Optional[str] = None) -> dict:
+    os.makedirs(config['output_dir'], exist_ok=True)
+    start = time.perf_counter()
+
+    results: list[JobResult] = []
+    def record(result: JobResult):
+        results.append(result)
+        status = 'failed' if result['error'] is not None else f"{result['seconds']:.1f}s"
+        print(f"[{len(results)}/{len(export_paths)}] {export_name(result['export'])}: {status}")
+
+    started_jobs = multiprocessing.SimpleQueue()
+    pending = list(export_paths)
+    while pending:
+        unfinished, broken = run_pool(pending, config, config['processes'], started_jobs, record)
+        if broken is None:
+            break
+        started = set()
+        while not started_jobs.empty():
+            started.add(started_jobs.get())
+        # A worker died (e.g. killed for running out of memory), and took down
+        # the jobs running next to it as well. Run each of those on its own to
+        # find the one that did it, then the rest that never started together.
+        suspects = [export_path for export_path in unfinished if export_path in started]
+        if not suspects:
+            # The workers couldn't even start, so retrying won't help
+            for export_path in unfinished:
+                record(worker_failed(export_path, broken))
+            break
+        for export_path in suspects:
+            _, broken = run_pool([export_path], config, 1, started_jobs, record)
+            if broken is not None:
+                record(worker_failed(export_path, broken))
+            while not started_jobs.empty():
+                started_jobs.get()
+        pending = [export_path for export_path in unfinished if export_path not in started]
+
+    seconds = time.perf_counter() - start
+    succeeded = [result for result in results if result['error'] is None]
+    summary = {
+        'jobs': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'seconds': seconds,
+        'jobs_per_minute': len(succeeded) / seconds * 60 if seconds > 0 else 0,
+        'frames_per_second': sum(result['frames_rendered'] for result in succeeded) / seconds if seconds > 0 else 0,
+        'config': config,
+        'failures': [{'export': result['export'], 'error': result['error']} for result in results if result['error'] is not None],
+        'results': sorted(results, key=lambda result: result['export']),
+    }
+    if summary_file is not None:
+        with open(summary_file, 'w') as file:
+            json.dump(summary, file, indent=2)
+    print(f"Rendered {summary['succeeded']} of {summary['jobs']} in {seconds:.1f}s ({summary['jobs_per_minute']:.1f} per minute), {summary['failed']} failed")
+    return summary
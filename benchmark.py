@@ -0,0 +1,186 @@
+import csv, datetime, json, os, random, shutil, subprocess, sys, tempfile, time
+import psutil
+from typing import TypedDict, Optional
+
+# How many diary rows to benchmark with, unless others are given on the command line
+DEFAULT_SIZES = [1000, 10000, 100000]
+# The stages of the pipeline that get timed, each in a fresh process
+STAGES = ['animate', 'graph', 'diary']
+# Where the machine readable results get written
+RESULTS_FILE = 'benchmark_results.json'
+# How long the CLI can take to start up and print its help, in seconds. Imports
+# for the subcommands are reported, but not held to this.
+STARTUP_BUDGET_SECONDS = 0.3
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class StageResult(TypedDict):
+    stage: str
+    rows: int
+    wall_seconds: float
+    frames: Optional[int]
+    frames_per_second: Optional[float]
+    peak_rss_bytes: int
+
+# Writes a fake Letterboxd export with the given number of diary rows into
+# directory, laid out the same way as the unzipped export
+def write_synthetic_export(directory: str, num_rows: int, seed: int = 0):
+    rng = random.Random(seed)
+    ratings = ['', '0.5', '1', '1.5', '2', '2.5', '3', '3', '3.5', '3.5', '4', '4', '4.5', '5']
+    tags = ['cinema', 'netflix', 'plane', 'friends', 'festival', 'criterion', 'date night', 'rewatchable']
+
+    os.makedirs(os.path.join(directory, 'likes'), exist_ok=True)
+    start = datetime.date(2010, 1, 1)
+
+    diary_rows: list[list[str]] = []
+    for i in range(num_rows):
+        # Roughly two films a day, so bigger diaries span more days
+        watched_date = (start + datetime.timedelta(days=i // 2 + rng.randint(0, 1))).isoformat()
+        diary_rows.append([
+            watched_date,
+            f'Film {i}',
+            str(1920 + i % 100),
+            f'https://boxd.it/{i:x}',
+            rng.choice(ratings),
+            'Yes' if rng.random() < 0.1 else '',
+            ', '.join(rng.sample(tags, rng.randint(0, 2))),
+            watched_date,
+        ])
+
+    with open(os.path.join(directory, 'diary.csv'), 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Date', 'Name', 'Year', 'Letterboxd URI', 'Rating', 'Rewatch', 'Tags', 'Watched Date'])
+        writer.writerows(diary_rows)
+
+    with open(os.path.join(directory, 'likes', 'films.csv'), 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Date', 'Name', 'Year', 'Letterboxd URI'])
+        for row in diary_rows:
+            if rng.random() < 0.25:
+                writer.writerow(row[:4])
+
+    with open(os.path.join(directory, 'watchlist.csv'), 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Date', 'Name', 'Year', 'Letterboxd URI'])
+        for i in range(num_rows // 2):
+            added_date = (start + datetime.timedelta(days=i)).isoformat()
+            writer.writerow([added_date, f'Watchlist Film {i}', str(1920 + i % 100), f'https://boxd.it/w{i:x}'])
+
+# Runs a single stage against the export in the current directory. This is
+# what runs in the child process, and returns how many frames it rendered.
+def run_stage(stage: str) -> Optional[int]:
+    if stage == 'animate':
+        import create_gif
+        from letterboxd_export import load_export
+        export = load_export('export')
+        create_gif.create_and_save_animation(export)
+        return len(create_gif.build_timeline(export))
+    elif stage == 'graph':
+        import graph
+        from letterboxd_export import load_export
+        graph.create_graph(load_export('export'), checkpoint_file=None)
+        return None
+    elif stage == 'diary':
+        # Everything but with_photos, which needs the network. Every film
+        # gets a placeholder poster instead.
+        import build_diary
+        from letterboxd_export import load_export
+        movies = build_diary.parse_letterboxd_history(load_export('export'))
+        for movie in movies.values():
+            movie['image'] = 'poster.jpg'
+        build_diary.create_website(dict(reversed(movies.items())))
+        return None
+    raise ValueError(f'Unknown stage: {stage}')
+
+# Returns the combined RSS of a process and all of its children (render
+# workers, ffmpeg), or 0 if it has already exited
+def tree_rss(process: psutil.Process) -> int:
+    total = 0
+    try:
+        processes = [process] + process.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0
+    for child in processes:
+        try:
+            total += child.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+# Times a stage in a fresh process inside directory, sampling its memory until it exits
+def measure_stage(stage: str, directory: str, rows: int) -> StageResult:
+    start = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--stage', stage],
+        cwd=directory,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    process = psutil.Process(child.pid)
+    peak_rss = 0
+    while child.poll() is None:
+        peak_rss = max(peak_rss, tree_rss(process))
+        time.sleep(0.01)
+    wall_seconds = time.perf_counter() - start
+
+    output = child.stdout.read() if child.stdout else ''
+    if child.returncode != 0:
+        raise Exception(f'Stage {stage} failed for {rows} rows')
+    frames = json.loads(output.strip().splitlines()[-1])['frames']
+
+    return {
+        'stage': stage,
+        'rows': rows,
+        'wall_seconds': round(wall_seconds, 3),
+        'frames': frames,
+        'frames_per_second': round(frames / wall_seconds, 1) if frames else None,
+        'peak_rss_bytes': peak_rss,
+    }
+
+# Times how long a command takes, taking the fastest of a few runs to skip
+# past a cold disk cache
+def fastest_run(command: list[str], runs: int = 5) -> float:
+    fastest = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, cwd=REPO_DIR)
+        fastest = min(fastest, time.perf_counter() - start)
+    return round(fastest, 3)
+
+# Times how long it takes to start the CLI and print the help for each
+# subcommand, and how long each subcommand's imports take on first use
+def measure_startup() -> dict[str, float]:
+    startup: dict[str, float] = {}
+    for command in [[], ['animate'], ['graph'], ['diary']]:
+        startup[' '.join(['cli.py'] + command)] = fastest_run([sys.executable, 'cli.py'] + command + ['--help'])
+    for module in ['create_gif', 'graph', 'build_diary']:
+        startup[f'import {module}'] = fastest_run([sys.executable, '-c', f'import {module}'])
+    return startup
+
+def run_benchmarks(sizes: list[int]) -> list[StageResult]:
+    results: list[StageResult] = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copytree(os.path.join(REPO_DIR, 'fonts'), os.path.join(directory, 'fonts'))
+            write_synthetic_export(os.path.join(directory, 'export'), rows)
+            for stage in STAGES:
+                result = measure_stage(stage, directory, rows)
+                print(f"{rows} rows, {stage}: {result['wall_seconds']}s, "
+                      f"{result['frames_per_second'] or '-'} fps, "
+                      f"{result['peak_rss_bytes'] / 2 ** 20:.0f} MB peak RSS", file=sys.stderr)
+                results.append(result)
+    return results
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--stage':
+        print(json.dumps({'frames': run_stage(sys.argv[2])}))
+    else:
+        sizes = [int(size) for size in sys.argv[1:]] or DEFAULT_SIZES
+        startup = measure_startup()
+        results = run_benchmarks(sizes)
+        with open(RESULTS_FILE, 'w') as file:
+            json.dump({'startup_seconds': startup, 'stages': results}, file, indent=2)
+
+        slow = {command: seconds for command, seconds in startup.items() if command.startswith('cli.py') and seconds > STARTUP_BUDGET_SECONDS}
+        if slow:
+            sys.exit(f'Startup over the {STARTUP_BUDGET_SECONDS}s budget: {slow}')
@@ -0,0 +1,101 @@
+import sys, time
+import numpy as np
+from bs4 import BeautifulSoup
+from letterboxd_html import DiaryPage, parse_diary_page, poster_src
+
+# Builds a diary page with the same markup as Letterboxd's around the fields
+# that get read, without needing to fetch one
+def synthetic_diary_page(num_rows: int, page_count: int = 1, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(num_rows):
+        slug = f'film-{i}'
+        rating = int(rng.integers(1, 11))
+        rows.append(f'''
+        <tr class="diary-entry-row viewing-poster-container" data-viewing-id="{1000 + i}" data-owner="me">
+            <td class="td-calendar"><div class="date"><strong><a href="/me/films/diary/for/2025/03/">Mar</a></strong><small>2025</small></div></td>
+            <td class="td-day diary-day center"><a href="/me/films/diary/for/2025/03/{i % 28 + 1:02d}/">{i % 28 + 1}</a></td>
+            <td class="td-film-details">
+                <div class="react-component poster film-poster linked-film-poster" data-film-id="{i}" data-film-slug="{slug}" data-poster-url="/film/{slug}/image-150/" data-linked="linked">
+                    <div><img src="https://s.ltrbxd.com/static/img/empty-poster-35.png" class="image" width="35" height="52" alt="Film &amp; {i}" /><span class="frame"><span class="frame-title"></span></span></div>
+                </div>
+                <h3 class="headline-3 prettify"><a href="/me/film/{slug}/">Film &amp; {i}</a></h3>
+            </td>
+            <td class="td-released center"><span>{1950 + i % 75}</span></td>
+            <td class="td-rating rating-green"><div class="hide-for-owner"><span class="rating rated-{rating}">{'★' * (rating // 2)}</span></div></td>
+            <td class="td-like center diary-like"><span class="has-icon icon-16 large-liked icon-liked hide-for-owner"><span class="icon"></span>Liked</span></td>
+            <td class="td-rewatch center icon-status-off"><span class="has-icon icon-rewatch icon-16"><span class="icon"></span></span></td>
+            <td class="td-review center"><a href="/me/film/{slug}/" class="has-icon icon-review icon-16 tooltip"><span class="icon"></span></a></td>
+            <td class="td-actions film-actions has-menu hide-when-logged-out" data-film-id="{i}" data-film-name="Film {i}" data-film-link="/film/{slug}/"></td>
+        </tr>''')
+    links = ''.join(f'<li class="paginate-page"><a href="/me/films/diary/for/2025/03/page/{page}/">{page}</a></li>' for page in range(1, page_count + 1))
+    return f'''<!DOCTYPE html><html><head><title>Diary</title></head><body class="diary">
+    <div id="content"><section class="section col-main">
+    <table class="table film-table" id="diary-table"><thead><tr><th>Month</th><th>Day</th><th>Film</th><th>Released</th><th>Rating</th></tr></thead>
+    <tbody>{''.join(rows)}</tbody></table>
+    <div class="pagination"><div class="paginate-pages"><ul>{links}</ul></div></div>
+    </section></div></body></html>'''
+
+def synthetic_poster_fragment(slug: str) -> str:
+    return f'''<div class="react-component poster film-poster" data-film-slug="{slug}">
+    <div><img src="https://a.ltrbxd.com/resized/film-poster/{slug}-0-500-0-750-crop.jpg" srcset="https://a.ltrbxd.com/resized/film-poster/{slug}-0-1000-0-1500-crop.jpg 2x" class="image" width="500" height="750" alt="{slug}" />
+    <span class="frame"><span class="frame-title"></span></span></div></div>'''
+
+# How the diary builder used to read pages, building a full BeautifulSoup tree
+def soup_diary_page(page: str) -> DiaryPage:
+    soup = BeautifulSoup(page, 'html.parser')
+    rows = []
+    for review in soup.find_all('tr', class_='diary-entry-row'):
+        rows.append({
+            'slug': review.find('div', class_='linked-film-poster').get('data-film-slug'),
+            'name': next(review.find('h3', class_='headline-3').children).contents[0],
+            'year': next(review.find('td', class_='td-released').children).contents[0],
+        })
+    pages = [int(link.get_text()) for link in soup.select('.paginate-pages .paginate-page a') if link.get_text().strip().isdigit()]
+    return {'rows': rows, 'page_count': max(pages, default=1)}
+
+def soup_poster_src(fragment: str) -> str:
+    return BeautifulSoup(fragment, 'html.parser').find('img', class_='image').get('src')
+
+# Parses every fixture with both parsers, checking that they pull out the same
+# records and reporting how long each took
+def compare_parsers(pages: list[str], fragments: list[str], repeats: int = 5):
+    for page in pages:
+        if parse_diary_page(page) != soup_diary_page(page):
+            raise Exception('Diary page parsers disagree')
+    for fragment in fragments:
+        if poster_src(fragment) != soup_poster_src(fragment):
+            raise Exception('Poster parsers disagree')
+
+    def seconds(parse, fixtures: list[str]) -> float:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for fixture in fixtures:
+                parse(fixture)
+        return (time.perf_counter() - start) / repeats
+
+    for name, fixtures, soup_parse, parse in [
+        ('diary pages', pages, soup_diary_page, parse_diary_page),
+        ('poster fragments', fragments, soup_poster_src, poster_src),
+    ]:
+        if len(fixtures) == 0:
+            continue
+        soup_seconds = seconds(soup_parse, fixtures)
+        parser_seconds = seconds(parse, fixtures)
+        print(f'{len(fixtures)} {name}: soup {soup_seconds * 1000:.1f} ms, parser {parser_seconds * 1000:.1f} ms '
+              f'({soup_seconds / parser_seconds:.1f}x)')
+
+if __name__ == '__main__':
+    # Saved HTML files can be passed in, e.g. pages fetched from Letterboxd.
+    # Otherwise synthetic ones are used.
+    if len(sys.argv) > 1:
+        fixtures = []
+        for path in sys.argv[1:]:
+            with open(path, encoding='utf-8') as file:
+                fixtures.append(file.read())
+        pages = [fixture for fixture in fixtures if 'diary-entry-row' in fixture]
+        fragments = [fixture for fixture in fixtures if 'diary-entry-row' not in fixture]
+    else:
+        pages = [synthetic_diary_page(50, 3, seed) for seed in range(10)]
+        fragments = [synthetic_poster_fragment(f'film-{i}') for i in range(200)]
+    compare_parsers(pages, fragments)
@@ -0,0 +1,45 @@
+import time
+import numpy as np
+from create_gif import RATING_BUCKETS, create_image, create_image_array
+
+# Builds a random timeline of cumulative bucket counts, without needing an export
+def random_timeline(num_frames: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    bucket_indices = rng.integers(0, len(RATING_BUCKETS), size=num_frames)
+    deltas = np.zeros((num_frames, len(RATING_BUCKETS)), dtype=np.int32)
+    deltas[np.arange(num_frames), bucket_indices] = 1
+    return np.cumsum(deltas, axis=0, dtype=np.int32)
+
+# Renders every frame of the timeline with both renderers, checking that the
+# frames match and reporting how long each renderer took
+def compare_renderers(timeline: np.ndarray, scale: int, tolerance: int = 0):
+    # Warm up the font and template caches so that they aren't timed
+    create_image(timeline[0], 1, scale)
+    create_image_array(timeline[0], 1, scale)
+
+    start = time.perf_counter()
+    for i, counts in enumerate(timeline):
+        np.asarray(create_image(counts, i + 1, scale))
+    pil_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, counts in enumerate(timeline):
+        create_image_array(counts, i + 1, scale)
+    numpy_seconds = time.perf_counter() - start
+
+    max_difference = 0
+    for i, counts in enumerate(timeline):
+        pil_frame = np.asarray(create_image(counts, i + 1, scale)).astype(np.int16)
+        numpy_frame = create_image_array(counts, i + 1, scale).astype(np.int16)
+        max_difference = max(max_difference, int(np.abs(pil_frame - numpy_frame).max()))
+    if max_difference > tolerance:
+        raise Exception(f'Renderers differ by up to {max_difference} at scale {scale}')
+
+    num_frames = len(timeline)
+    print(f'scale {scale}: pil {num_frames / pil_seconds:.0f} fps, numpy {num_frames / numpy_seconds:.0f} fps '
+          f'({pil_seconds / numpy_seconds:.1f}x), max difference {max_difference}')
+
+if __name__ == '__main__':
+    timeline = random_timeline(2000)
+    for scale in [1, 2, 4]:
+        compare_renderers(timeline, scale)
@@ -1,6 +1,10 @@
-import csv, copy, math, requests
-from typing import TypedDict, Optional, Any
-from bs4 import BeautifulSoup
+import html, math, os, re, requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, Optional, Any, Callable
+from requests.adapters import HTTPAdapter, Retry
+from letterboxd_export import Export
+from letterboxd_html import DiaryPage, DiaryRow, parse_diary_page, poster_src
+from web_cache import WebCache
 
 class Movie(TypedDict):
     name: str
@@ -11,84 +15,209 @@ class Movie(TypedDict):
     url: str
     image: Optional[str]
 
-# Takes in a CSV file and returns the list of movies
-def parse_letterboxd_history(diary_file: str, likes_file: str) -> dict[str, Movie]:
+# Takes in the parsed export and returns the movies, keyed by name and year
+def parse_letterboxd_history(export: Export) -> dict[str, Movie]:
     movies: dict[str, Movie] = {}
 
-    with open(diary_file, newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            watched_date = row['Watched Date']
-            name = row['Name']
-            year = row['Year']
-            url = row['Letterboxd URI']
-            rewatched = (row['Rewatch'] == 'Yes')
-            if row['Rating'] == '':
-                rating = None
-            else:
-                rating = float(row['Rating'])
-
-            movies[f'{name} ({year})'] = {
-                'name': name,
-                'year': year,
-                'rating': rating,
-                'watched_date': watched_date,
-                'liked': False, # default to false
-                'rewatched': rewatched,
-                'url': url,
-            }
-
-    # Mark liked movies
-    with open(likes_file, newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            name = row['Name']
-            year = row['Year']
-
-            index_name = f'{name} ({year})'
-
-            if index_name in movies:
-                movies[index_name]['liked'] = True
+    names = export['names'].tolist()
+    years = export['years'].tolist()
+    uris = export['uris'].tolist()
+    watched_dates = export['watched_days'].astype('datetime64[D]').astype(str).tolist()
+    ratings = export['ratings'].astype(float).tolist()
+    liked = export['liked'].tolist()
+    rewatched = export['rewatched'].tolist()
+
+    for i in range(len(names)):
+        rating = ratings[i]
+        movies[f'{names[i]} ({years[i]})'] = {
+            'name': names[i],
+            'year': years[i],
+            'rating': None if math.isnan(rating) else rating,
+            'watched_date': watched_dates[i],
+            'liked': liked[i],
+            'rewatched': rewatched[i],
+            'url': uris[i],
+        }
 
     return movies
 
-def with_photos(all_movies: dict[str, Movie], month_url: str) -> dict[str, Movie]:
-    response = requests.get(month_url)
-
-    movies: dict[str, Movie] = {}
-
-    if response.status_code == 200:
-        html_content = response.text
-    else:
-        raise Exception("Failed to retrieve the web page")
-
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    all_reviews = soup.find_all('tr', class_='diary-entry-row')
-
-    for review in all_reviews:
-        film_poster = review.find('div', class_='linked-film-poster')
-        name = next(review.find('h3', class_='headline-3').children).contents[0]
-        year = next(review.find('td', class_='td-released').children).contents[0]
-
-        # 300x450
-        poster_uri = 'https://letterboxd.com/ajax/poster/film/' + film_poster.get('data-film-slug') + '/std/500x750/'
-        poster_response = requests.get(poster_uri)
-
-        poster_soup = BeautifulSoup(poster_response.text, 'html.parser')
-        img_element = poster_soup.find('img', class_='image')
-
-        src_url = img_element.get('src')
-
-        index_name = f'{name} ({year})'
+LETTERBOXD_URL = 'https://letterboxd.com'
+
+# How long cached diary pages and resolved posters are used for before they're
+# revalidated. Poster URLs for a film almost never change.
+CACHE_TTL_SECONDS = {
+    'pages': 12 * 60 * 60,
+    'posters': 30 * 24 * 60 * 60,
+}
+
+# The diary page for a month, given as YYYY/MM
+def diary_month_url(username: str, month: str, base_url: str = LETTERBOXD_URL) -> str:
+    return f'{base_url}/{username}/films/diary/for/{month}/'
+
+# The month (YYYY/MM) of a URL from diary_month_url
+def diary_url_month(month_url: str) -> Optional[str]:
+    match = re.search(r'/for/(\d{4}/\d{2})/$', month_url)
+    return match.group(1) if match else None
+
+# The HTML fragment with a film's 500x750 poster in it
+def poster_fragment_url(slug: str, base_url: str = LETTERBOXD_URL) -> str:
+    return f'{base_url}/ajax/poster/film/{slug}/std/500x750/'
+
+# A session that keeps up to pool_size connections open for reuse, and retries
+# failed connections and server errors with exponential backoff (backoff,
+# 2 * backoff, 4 * backoff, ... seconds between attempts)
+def make_session(pool_size: int, retries: int, backoff: float) -> requests.Session:
+    retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+# Fetches url and returns parse of its body. With a cache, the parsed value is
+# stored under kind and key: fresh entries are used without touching the
+# network, and stale ones (or any, with revalidate) are revalidated with a
+# conditional request.
+def fetch(
+    session: requests.Session,
+    url: str,
+    timeout: float,
+    cache: Optional[WebCache] = None,
+    kind: str = 'pages',
+    key: Optional[str] = None,
+    parse: Callable[[str], str] = lambda text: text,
+    revalidate: bool = False,
+) -> str:
+    key = url if key is None else key
+    entry = cache.get(kind, key) if cache is not None else None
+    if entry is not None and not revalidate and cache.is_fresh(kind, entry):
+        return entry['value']
+
+    headers = {}
+    if entry is not None and entry['etag'] is not None:
+        headers['If-None-Match'] = entry['etag']
+    if entry is not None and entry['last_modified'] is not None:
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    response = session.get(url, timeout=timeout, headers=headers)
+    if response.status_code == 304 and entry is not None:
+        cache.refresh(kind, entry)
+        return entry['value']
+    if response.status_code != 200:
+        raise Exception(f'Failed to retrieve {url} ({response.status_code})')
+
+    value = parse(response.text)
+    if cache is not None:
+        cache.put(kind, key, value, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return value
+
+# The URL of a film's poster, cached by the film's slug
+def resolve_poster(session: requests.Session, slug: str, timeout: float, base_url: str = LETTERBOXD_URL, cache: Optional[WebCache] = None) -> str:
+    return fetch(session, poster_fragment_url(slug, base_url), timeout, cache, 'posters', slug, poster_src)
+
+# The months from start to end inclusive, all given as YYYY/MM
+def months_between(start: str, end: str) -> list[str]:
+    first, last = (int(year) * 12 + int(month) - 1 for year, month in (start.split('/'), end.split('/')))
+    return [f'{index // 12:04d}/{index % 12 + 1:02d}' for index in range(first, last + 1)]
+
+# A page of a month's diary. Months with more entries than fit on one page
+# carry on over /page/2/, /page/3/ and so on.
+def diary_page_url(month_url: str, page: int) -> str:
+    return month_url if page == 1 else f'{month_url}page/{page}/'
+
+# The index names and film slugs of the rows of a diary page that are in the
+# export, in the page's order
+def diary_entries(rows: list[DiaryRow], all_movies: dict[str, Movie]) -> list[tuple[str, str]]:
+    entries: list[tuple[str, str]] = []
+    for row in rows:
+        index_name = f'{row["name"]} ({row["year"]})'
         if index_name in all_movies:
+            entries.append((index_name, row['slug']))
+    return entries
+
+# The films in the export that were last watched in the month of month_url,
+# which its diary has to list
+def films_watched_in(all_movies: dict[str, Movie], month_url: str) -> set[str]:
+    month = diary_url_month(month_url)
+    if month is None:
+        return set()
+    prefix = month.replace('/', '-')
+    return {index_name for index_name, movie in all_movies.items() if movie['watched_date'].startswith(prefix)}
+
+# Adds the posters to the movies in the diaries of each month, keeping each
+# diary's order. The first page of every month is fetched at once, then any
+# further pages, then every poster, all concurrently over a shared pool of
+# connections. A film in more than one month only gets looked up once. With a
+# cache, months that were built recently need no requests at all, unless the
+# export has films for the month that its cached pages don't list (e.g. right
+# after logging more), in which case its pages are revalidated.
+def with_photos_by_month(
+    all_movies: dict[str, Movie],
+    month_urls: list[str],
+    # How many pages or posters to fetch at once
+    workers: int = 8,
+    # Seconds to wait to connect, and then between bytes of the response
+    timeout: float = 10,
+    # Times to retry a request that fails, and the base delay between them
+    retries: int = 3,
+    backoff: float = 0.5,
+    base_url: str = LETTERBOXD_URL,
+    cache: Optional[WebCache] = None,
+) -> dict[str, dict[str, Movie]]:
+    with make_session(workers, retries, backoff) as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        # The rows of every page of each month
+        def read_months(urls: list[str], revalidate: bool = False) -> dict[str, list[DiaryRow]]:
+            def read_page(url: str) -> DiaryPage:
+                return parse_diary_page(fetch(session, url, timeout, cache, revalidate=revalidate))
+
+            first_pages = list(executor.map(read_page, urls))
+            later_urls = [
+                (month_url, diary_page_url(month_url, page))
+                for month_url, first_page in zip(urls, first_pages)
+                for page in range(2, first_page['page_count'] + 1)
+            ]
+            later_pages = executor.map(read_page, [url for _, url in later_urls])
+
+            month_rows = {month_url: list(page['rows']) for month_url, page in zip(urls, first_pages)}
+            for (month_url, _), page in zip(later_urls, later_pages):
+                month_rows[month_url] += page['rows']
+            return month_rows
+
+        month_rows = read_months(month_urls)
+        if cache is not None:
+            stale = [
+                month_url for month_url in month_urls
+                if films_watched_in(all_movies, month_url) - {f'{row["name"]} ({row["year"]})' for row in month_rows[month_url]}
+            ]
+            if stale:
+                month_rows.update(read_months(stale, revalidate=True))
+
+        month_entries = {month_url: diary_entries(rows, all_movies) for month_url, rows in month_rows.items()}
+
+        slugs = list(dict.fromkeys(slug for entries in month_entries.values() for _, slug in entries))
+        images = dict(zip(slugs, executor.map(lambda slug: resolve_poster(session, slug, timeout, base_url, cache), slugs)))
+
+    months: dict[str, dict[str, Movie]] = {}
+    for month_url, entries in month_entries.items():
+        movies: dict[str, Movie] = {}
+        for index_name, slug in entries:
             movies[index_name] = all_movies[index_name]
-            movies[index_name]['image'] = src_url
-
-    return movies
-
-def create_website(movies: dict[str, Movie]):
-    html_content = """
+            movies[index_name]['image'] = images[slug]
+        months[month_url] = movies
+
+    if cache is not None:
+        cache.evict()
+    return months
+
+# Adds the poster to every movie in the month's diary, keeping its order
+def with_photos(all_movies: dict[str, Movie], month_url: str, **settings: Any) -> dict[str, Movie]:
+    return with_photos_by_month(all_movies, [month_url], **settings)[month_url]
+
+# Writes the month's page. With thumbnails (by poster URL, from
+# poster_thumbnails.make_thumbnails) the posters are served from local files in
+# a few sizes, and the browser picks the smallest one that fits the layout.
+def create_website(movies: dict[str, Movie], output_file: str = 'index.html', thumbnails: Optional[dict[str, dict[str, list[tuple[int, str]]]]] = None):
+    parts = ["""
     <!DOCTYPE html>
     <html>
     <head>
@@ -169,9 +298,7 @@ def create_website(movies: dict[str, Movie]):
                 }
 
                 let minRow, maxRow, optimalColumns, optimalWidth, width, height;
-    """
-    html_content += "let numMovies = {num_movies}".format(num_movies=len(movies))
-    html_content += """
+    """, "let numMovies = {num_movies}".format(num_movies=len(movies)), """
                 if (isHorizontalLayout) {
                     minRow = 1
                     maxRow = Math.floor(Math.sqrt(numMovies));
@@ -208,17 +335,21 @@ def create_website(movies: dict[str, Movie]):
                 document.querySelectorAll('.movie').forEach(element => {
                     element.style.width = optimalWidth + 'px';
                 });
+                // Let local posters pick the smallest size that fills the grid
+                document.querySelectorAll('.movie [srcset]').forEach(element => {
+                    element.sizes = Math.ceil(optimalWidth) + 'px';
+                });
             }
 
-            // Call the function on page load
-            window.addEventListener('load', calculateGridLayout);
+            // Call the function once the page is parsed, before the posters load
+            window.addEventListener('DOMContentLoaded', calculateGridLayout);
             // and reload
             window.addEventListener('resize', calculateGridLayout);
         </script>
     </head>
     <body>
-    """
-    # html_content += "<ul>\n"
+    """]
+    directory = os.path.dirname(output_file) or '.'
     for movie_name in movies:
         movie = movies[movie_name]
         rating = ''
@@ -228,26 +359,55 @@ def create_website(movies: dict[str, Movie]):
             if (movie['rating'] % 1 == 0.5):
                 rating += '½'
 
-        html_content += '''
+        if thumbnails is not None and movie['image'] in thumbnails:
+            variants = thumbnails[movie['image']]
+            srcsets = {
+                extension: ', '.join(f'{html.escape(os.path.relpath(path, directory))} {width}w' for width, path in sizes)
+                for extension, sizes in variants.items()
+            }
+            poster = '''<picture>
+            <source type='image/webp' srcset='{webp}' sizes='10vw'>
+            <img class='poster' srcset='{jpeg}' sizes='10vw' src='{src}'>
+            </picture>'''.format(webp=srcsets['webp'], jpeg=srcsets['jpeg'], src=html.escape(os.path.relpath(variants['jpeg'][-1][1], directory)))
+        else:
+            poster = "<img class='poster' src='{image}'>".format(image=movie['image'])
+
+        parts.append('''
             <div class='movie'>
             <span class='title'>{name}</span>
-            <img class='poster' src='{image}'>
+            {poster}
             <span class='rating'>{rating}</span>
-        '''.format(name=movie['name'], image=movie['image'], rating=rating)
+        '''.format(name=movie['name'], poster=poster, rating=rating))
         if (movie['liked']):
-            html_content += "<span class='liked'>♥</span>"
+            parts.append("<span class='liked'>♥</span>")
         if (movie['rewatched']):
-            html_content += "<span class='rewatched'>⟳</span>"
-
-        html_content += "</div>\n"
-
-    html_content += "</body>\n</html>"
-
-    # Save the HTML content to a file
-    with open("index.html", "w") as html_file:
-        html_file.write(html_content)
-
-movies = parse_letterboxd_history('export/diary.csv', 'export/likes/films.csv')
-# Set this to whatever month you want
-movies = with_photos(movies, 'https://letterboxd.com/dado3212/films/diary/for/2025/03/')
-create_website(dict(reversed(movies.items())))
+            parts.append("<span class='rewatched'>⟳</span>")
+
+        parts.append("</div>\n")
+
+    parts.append("</body>\n</html>")
+
+    # Save the HTML content to a file, joining it all in one go
+    with open(output_file, "w") as html_file:
+        html_file.write(''.join(parts))
+
+# Writes a page linking to each month's page, given as YYYY/MM and its file
+def create_index(month_files: dict[str, str], output_file: str = 'index.html'):
+    links = [f"<li><a href='{html.escape(path)}'>{month}</a></li>" for month, path in month_files.items()]
+    with open(output_file, 'w') as html_file:
+        html_file.write('\n'.join([
+            '<!DOCTYPE html>',
+            '<html>',
+            '<head><title>Letterboxd Diary</title></head>',
+            "<body style='background-color: rgb(20, 24, 28); color: rgb(85, 102, 119); font-size: 1.2em;'>",
+            '<ul>',
+            *links,
+            '</ul>',
+            '</body>',
+            '</html>',
+        ]))
+
+if __name__ == '__main__':
+    import sys
+    from cli import main
+    main(['diary'] + sys.argv[1:])
@@ -0,0 +1,207 @@
+import argparse, sys
+from typing import Optional
+
+# Each subcommand imports what it needs when it runs, and nothing does any work
+# at import time, so starting up (and --help) stays fast.
+
+def animate(args: argparse.Namespace):
+    from create_gif import create_and_save_animation
+    from letterboxd_export import load_export
+    from profiling import Profile
+
+    frame_store = None
+    if args.frame_store:
+        from frame_store import FrameStore
+        frame_store = FrameStore(args.frame_store, args.frame_store_size * 1024 * 1024)
+
+    if args.profile is not None:
+        profile = Profile(args.profile, args.cprofile)
+    else:
+        profile = Profile.from_environment()
+    with profile.stage('parse'):
+        export = load_export(args.export)
+    create_and_save_animation(
+        export,
+        profile,
+        target_duration_seconds=args.duration,
+        final_frame_duration=args.final_frame_duration,
+        num_loops=args.loops,
+        scale_image=args.scale,
+        scale_effect=args.scale_effect,
+        render_processes=args.processes,
+        renderer=args.renderer,
+        output_file=args.output,
+        frame_budget=args.frames,
+        target_fps=args.fps,
+        sample_every=args.every,
+        frame_store=frame_store,
+    )
+    profile.write()
+
+def graph(args: argparse.Namespace):
+    from graph import create_graph
+    from letterboxd_export import load_export
+
+    create_graph(
+        load_export(args.export),
+        output_file=args.output,
+        checkpoint_file=args.checkpoint or None,
+        scalable_output=not args.full,
+        max_tags=args.max_tags or None,
+    )
+
+def diary(args: argparse.Namespace):
+    from build_diary import CACHE_TTL_SECONDS, create_index, create_website, diary_month_url, months_between, parse_letterboxd_history, with_photos_by_month
+    from letterboxd_export import load_export
+    from web_cache import WebCache
+
+    cache = None
+    if args.cache:
+        ttl_seconds = dict(CACHE_TTL_SECONDS)
+        if args.page_ttl is not None:
+            ttl_seconds['pages'] = args.page_ttl * 60 * 60
+        if args.poster_ttl is not None:
+            ttl_seconds['posters'] = args.poster_ttl * 60 * 60
+        cache = WebCache(args.cache, ttl_seconds, args.cache_size * 1024 * 1024)
+
+    movies = parse_letterboxd_history(load_export(args.export))
+    months = [args.month] if args.to is None else months_between(args.month, args.to)
+    month_urls = [diary_month_url(args.user, month) for month in months]
+    month_movies = with_photos_by_month(
+        movies,
+        month_urls,
+        workers=args.workers,
+        timeout=args.timeout,
+        retries=args.retries,
+        backoff=args.backoff,
+        cache=cache,
+    )
+
+    thumbnails = None
+    images = [movie['image'] for movies in month_movies.values() for movie in movies.values()]
+    if args.thumbnails:
+        from poster_thumbnails import make_thumbnails
+        thumbnails = make_thumbnails(images, args.thumbnails, processes=args.processes, workers=args.workers, timeout=args.timeout)
+
+    # A range of months gets a page per month, and an index linking to them
+    pages: dict[str, str] = {}
+    for month, month_url in zip(months, month_urls):
+        pages[month_url] = args.output if args.to is None else args.month_output.format(month=month.replace('/', '-'))
+        create_website(dict(reversed(month_movies[month_url].items())), pages[month_url], thumbnails)
+    if args.to is not None:
+        create_index(dict(zip(months, pages.values())), args.output)
+
+    # Also render each page straight to a PNG, without a browser
+    if args.png:
+        import os
+        from diary_image import render_diary_image
+        from poster_thumbnails import download_posters
+
+        width, height = (int(size) for size in args.png.split('x'))
+        posters = download_posters(images, os.path.join(args.thumbnails or '.cache', 'originals'), args.workers, args.timeout)
+        for month_url, page in pages.items():
+            render_diary_image(dict(reversed(month_movies[month_url].items())), posters, os.path.splitext(page)[0] + '.png', width, height, args.pixel_ratio)
+
+def batch(args: argparse.Namespace):
+    import glob, os
+    from batch_animate import load_config, render_batch
+
+    config = load_config(args.config)
+    for key, value in [
+        ('output_dir', args.output_dir),
+        ('output_format', args.format),
+        ('processes', args.processes),
+        ('memory_limit_mb', args.memory_limit),
+    ]:
+        if value is not None:
+            config[key] = value
+
+    # A folder that isn't an unzipped export is searched for export .zips
+    export_paths: list[str] = []
+    for path in args.exports:
+        if os.path.isdir(path) and not os.path.exists(os.path.join(path, 'diary.csv')):
+            export_paths += sorted(glob.glob(os.path.join(path, '*.zip')))
+        else:
+            export_paths.append(path)
+    render_batch(export_paths, config, args.summary)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Make animations, graphs and diary pages out of a Letterboxd export.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    animate_parser = subparsers.add_parser('animate', help='animate the ratings distribution over time')
+    animate_parser.add_argument('--export', default='export', help='folder with the unzipped export (default: export)')
+    animate_parser.add_argument('--output', default='animation.mp4', help='.mp4 or .gif to write (default: animation.mp4)')
+    animate_parser.add_argument('--scale', type=int, default=4, help='multiple of 256x80 to render at (default: 4)')
+    animate_parser.add_argument('--duration', type=float, default=10, help='target length in seconds (default: 10)')
+    animate_parser.add_argument('--final-frame-duration', type=float, default=1, help='seconds to hold the last frame (default: 1)')
+    animate_parser.add_argument('--loops', type=int, default=1, help='times to repeat the animation in an mp4 (default: 1)')
+    animate_parser.add_argument('--scale-effect', type=int, default=2, help='strength of the easing, >= 1 (default: 2)')
+    animate_parser.add_argument('--processes', type=int, default=None, help='processes to render with (default: one per CPU)')
+    animate_parser.add_argument('--renderer', choices=['numpy', 'pil'], default='numpy', help='frame renderer (default: numpy)')
+    sampling = animate_parser.add_mutually_exclusive_group()
+    sampling.add_argument('--frames', type=int, default=None, help='only render this many frames, evenly spaced in time (default: one per rating)')
+    sampling.add_argument('--every', choices=['day', 'week', 'month'], default=None, help='only render a frame at the end of each day, week or month')
+    animate_parser.add_argument('--fps', type=float, default=None, help='only render enough frames, evenly spaced in time, for this frame rate; with --frames or --every, just the frame rate')
+    animate_parser.add_argument('--frame-store', default=None, help='keep encoded segments of the mp4 here, and only redo the ones that changed (needs --every and --fps)')
+    animate_parser.add_argument('--frame-store-size', type=int, default=1024, help='megabytes to keep in the frame store (default: 1024)')
+    animate_parser.add_argument('--profile', default=None, help='write a JSON profile report here')
+    animate_parser.add_argument('--cprofile', default=None, help='with --profile, also dump cProfile stats here')
+    animate_parser.set_defaults(run=animate)
+
+    graph_parser = subparsers.add_parser('graph', help='graph cumulative counts over time')
+    graph_parser.add_argument('--export', default='export', help='folder with the unzipped export (default: export)')
+    graph_parser.add_argument('--output', default='movies_graph.html', help='HTML file to write (default: movies_graph.html)')
+    graph_parser.add_argument('--checkpoint', default='movies_graph.checkpoint.pkl', help="where to keep counts between runs, '' for none")
+    graph_parser.add_argument('--max-tags', type=int, default=20, help='only plot the most used tags, 0 for all (default: 20)')
+    graph_parser.add_argument('--full', action='store_true', help='plot every day with SVG traces instead of the scalable output')
+    graph_parser.set_defaults(run=graph)
+
+    diary_parser = subparsers.add_parser('diary', help="build a page of a month's diary posters")
+    diary_parser.add_argument('month', help='month to build, as YYYY/MM')
+    diary_parser.add_argument('--to', default=None, help='build every month from month up to this one (YYYY/MM) as well')
+    diary_parser.add_argument('--user', default='dado3212', help='Letterboxd username (default: dado3212)')
+    diary_parser.add_argument('--export', default='export', help='folder with the unzipped export (default: export)')
+    diary_parser.add_argument('--output', default='index.html', help='HTML file to write, or the index of months with --to (default: index.html)')
+    diary_parser.add_argument('--month-output', default='diary-{month}.html', help='with --to, where to write each month (default: diary-{month}.html)')
+    diary_parser.add_argument('--workers', type=int, default=8, help='posters to look up at once (default: 8)')
+    diary_parser.add_argument('--timeout', type=float, default=10, help='seconds to wait on each request (default: 10)')
+    diary_parser.add_argument('--retries', type=int, default=3, help='times to retry a failed request (default: 3)')
+    diary_parser.add_argument('--backoff', type=float, default=0.5, help='base seconds to back off between retries (default: 0.5)')
+    diary_parser.add_argument('--thumbnails', default=None, help='download the posters into this folder and serve them resized from there')
+    diary_parser.add_argument('--processes', type=int, default=None, help='with --thumbnails, processes to resize with (default: one per CPU)')
+    diary_parser.add_argument('--png', default=None, help='also render each page to a PNG of this size, e.g. 1920x1080')
+    diary_parser.add_argument('--pixel-ratio', type=float, default=1, help='with --png, how many pixels to draw per CSS pixel (default: 1)')
+    diary_parser.add_argument('--cache', default='.cache/letterboxd', help="where to cache pages and posters, '' for none (default: .cache/letterboxd)")
+    diary_parser.add_argument('--cache-size', type=int, default=64, help='megabytes to keep in the cache (default: 64)')
+    diary_parser.add_argument('--page-ttl', type=float, default=None, help='hours to use a cached diary page before revalidating it (default: 12)')
+    diary_parser.add_argument('--poster-ttl', type=float, default=None, help='hours to use a cached poster before revalidating it (default: 720)')
+    diary_parser.set_defaults(run=diary)
+
+    batch_parser = subparsers.add_parser('batch', help='animate many exports at once, straight from their .zips')
+    batch_parser.add_argument('exports', nargs='+', help='export .zips or folders, or folders of .zips')
+    batch_parser.add_argument('--config', default=None, help='JSON file of batch settings (see batch_animate.BatchConfig)')
+    batch_parser.add_argument('--output-dir', default=None, help='folder to write the animations to (default: animations)')
+    batch_parser.add_argument('--format', choices=['.mp4', '.gif'], default=None, help='animation format (default: .mp4)')
+    batch_parser.add_argument('--processes', type=int, default=None, help='exports to render at once (default: one per CPU)')
+    batch_parser.add_argument('--memory-limit', type=int, default=None, help='megabytes each job can use (default: no limit)')
+    batch_parser.add_argument('--summary', default='batch_summary.json', help='where to write the throughput and failure summary (default: batch_summary.json)')
+    batch_parser.set_defaults(run=batch)
+
+    return parser
+
+def main(argv: Optional[list[str]] = None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'animate' and args.frame_store:
+        if args.output.endswith('.gif'):
+            parser.error('--frame-store only works with .mp4 output')
+        # Segments are keyed by their frames and the frame rate. Without both
+        # a fixed period and rate, every frame moves whenever the diary gains a
+        # day, so nothing would ever be reused.
+        if args.every is None or args.fps is None:
+            parser.error('--frame-store needs --every and --fps, e.g. --every day --fps 30')
+    args.run(args)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,42 +1,55 @@
-import csv, copy, imageio, math
-from typing import TypedDict, Optional, Any
-from PIL import Image, ImageDraw, ImageFont
-
-class Movie(TypedDict):
-    name: str
-    rating: Optional[float] # out of 5
-
-# Takes in a CSV file and returns the list of movies
-def parse_letterboxd_history(csv_file: str) -> dict[str, list[Movie]]:
-    movies: dict[str, list[Movie]] = {}
-
-    with open(csv_file, newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            watched_date = row['Watched Date']
-            name = row['Name']
-            if row['Rating'] == '':
-                rating = None
-            else:
-                rating = float(row['Rating'])
-            if watched_date not in movies:
-                movies[watched_date] = []
-                movies[watched_date].append({
-                    'name': name,
-                    'rating': rating,
-                })
-    return movies
+import imageio, math, os
+import numpy as np
+from typing import TypedDict, Optional, Sequence, Iterator, Callable, Any
+from PIL import GifImagePlugin, Image, ImageDraw, ImageFont
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from frame_store import FrameStore, concat_segments
+from letterboxd_export import Export
+from profiling import Profile
+
+# The rating buckets, in the order that their bars are drawn
+RATING_BUCKETS: list[float] = [0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5]
+
+# Bump this whenever the way frames are drawn changes, so that stored frames
+# from an older version don't get reused
+RENDERER_VERSION = 1
+
+# Takes in the export and returns the running count of each rating bucket after
+# every rated movie, in the order they were watched, as an (n_frames x 10)
+# array. Row i is the distribution that frame i shows, so this stays linear in
+# the number of ratings.
+def build_timeline(export: Export) -> np.ndarray:
+    order = np.argsort(export['watched_days'], kind='stable')
+    ratings = export['ratings'][order].astype(np.float64)
+    ratings = ratings[~np.isnan(ratings)]
+    bucket_indices = np.searchsorted(RATING_BUCKETS, ratings)
+
+    deltas = np.zeros((len(bucket_indices), len(RATING_BUCKETS)), dtype=np.int32)
+    deltas[np.arange(len(bucket_indices)), bucket_indices] = 1
+    return np.cumsum(deltas, axis=0, dtype=np.int32)
+
+# Everything about a frame that doesn't change between frames of a given scale
+class FrameTemplate(TypedDict):
+    base: Image.Image # background, header, underline and stars
+    count_font: ImageFont.FreeTypeFont
+    count_bottom: int # y position that the bottom of the count text lines up with
+
+_frame_templates: dict[int, FrameTemplate] = {}
+
+# Loads the fonts and renders the static parts of a frame, once per scale
+def get_frame_template(scale: int) -> FrameTemplate:
+    if scale in _frame_templates:
+        return _frame_templates[scale]
 
-# For a current distribution of movies, creates a single Image frame
-def create_image(bucket_info: dict[float, list[Movie]], count: int, scale: int):
     # Dimensions of the frames and GIF
     width: int = 256 * scale # actually 250 on the website
     height: int = 80 * scale
 
-    frame = Image.new('RGB', (width, height), '#14181c')
+    base = Image.new('RGB', (width, height), '#14181c')
 
     # Create a drawing object
-    draw = ImageDraw.Draw(frame)
+    draw = ImageDraw.Draw(base)
 
     # Draw the ratings text
     text = 'RATINGS'
@@ -46,13 +59,6 @@ def create_image(bucket_info: dict[float, list[Movie]], count: int, scale: int):
     text_height = text_bbox[3]
     draw.text((1, 1), text, font=font, fill='#9ab')
 
-    # Draw the number of reviews text
-    text = str(count)
-    font = ImageFont.truetype("fonts/Graphik-Regular-Web.woff", size=11 * scale)
-    text_bbox = draw.textbbox((0, 0), text, font=font)
-
-    draw.text((width - text_bbox[2] - 1 * scale, text_start_height + text_height - text_bbox[3]), text, font=font, fill='#678')
-
     # Draw the underline
     draw.line(
         (0, text_height + text_start_height + 2 * scale, width, text_height + text_start_height + 2 * scale),
@@ -60,47 +66,208 @@ def create_image(bucket_info: dict[float, list[Movie]], count: int, scale: int):
         width=1 * scale
     )
 
-    # Calculate the boxes that we're going to draw
-    boxes: list[int] = []
-    highest: int = 0
-    for key in bucket_info.keys():
-        count = len(bucket_info[key])
-        boxes.append(count)
-        if (count > highest):
-            highest = count
+    # Draw the stars. The bars never reach them, so they can live in the base
+    star_font = ImageFont.truetype("fonts/seguisym.ttf", size=12*scale)
+    text = '★'
+    star_bbox = draw.textbbox((0, 0), text, font=star_font)
+    draw.text((1 * scale, height - star_bbox[3] - 1), text, font=star_font, fill='#00c030')
+
+    text = '★★★★★'
+    star_bbox = draw.textbbox((0, 0), text, font=star_font)
+    draw.text((width - star_bbox[2], height - star_bbox[3] - 1 * scale), text, font=star_font, fill='#00c030')
+
+    template: FrameTemplate = {
+        'base': base,
+        'count_font': ImageFont.truetype("fonts/Graphik-Regular-Web.woff", size=11 * scale),
+        'count_bottom': text_start_height + text_height,
+    }
+    _frame_templates[scale] = template
+    return template
 
-    box_width = 17 * scale
+# Frames with only their bars drawn, keyed by the renderer, the scale and the
+# pixel top of each bar. Once a diary has a few thousand ratings most new
+# ratings don't move any bar by a whole pixel, so runs of consecutive frames
+# share a bar layer and only differ by their count. Frames are reused in
+# order, so only a handful of recent layers need to be kept.
+BAR_LAYER_CACHE_SIZE = 32
+_bar_layers: OrderedDict[tuple, Any] = OrderedDict()
+
+# Calculates the pixel row that the top of each bar starts at. Pillow truncates
+# the float top edge of each box, so this is exactly what gets drawn.
+def bar_tops(bucket_counts: Sequence[int], scale: int) -> tuple[int, ...]:
+    height = 80 * scale
     box_max_height = 44 * scale
 
-    offset = 15 * scale
+    boxes = np.asarray(bucket_counts, dtype=np.int64)
+    highest = int(boxes.max())
+    return tuple((height - (box_max_height * 1.0 * boxes / highest) - 1).astype(np.int64).tolist())
 
-    # Draw the boxes
-    for count in boxes:
-        draw.rectangle((
-            offset,
-            height - (box_max_height * 1.0 * count / highest) - 1,
-            offset + box_width,
-            height + 1,
-        ), fill='#678')
-        offset += box_width + 2 * scale
+# Returns the cached bar layer for a key, building it if it isn't cached yet
+def get_bar_layer(key: tuple, build: Callable[[], Any]) -> Any:
+    if key in _bar_layers:
+        _bar_layers.move_to_end(key)
+        return _bar_layers[key]
 
-    # Draw the stars
-    star_font = ImageFont.truetype("fonts/seguisym.ttf", size=12*scale)
-    text = '★'
-    text_bbox = draw.textbbox((0, 0), text, font=star_font)
-    text_start_height = text_bbox[1]
-    text_height = text_bbox[3]
-    draw.text((1 * scale, height - text_height - 1), text, font=star_font, fill='#00c030')
+    layer = build()
+    _bar_layers[key] = layer
+    if len(_bar_layers) > BAR_LAYER_CACHE_SIZE:
+        _bar_layers.popitem(last=False)
+    return layer
 
-    text = '★★★★★'
-    text_bbox = draw.textbbox((0, 0), text, font=star_font)
-    text_width = text_bbox[2]
-    text_height = text_bbox[3]
-    draw.text((width - text_width, height - text_height - 1 * scale), text, font=star_font, fill='#00c030')
+# For a current distribution of movies, creates a single Image frame
+def create_image(bucket_counts: Sequence[int], count: int, scale: int):
+    template = get_frame_template(scale)
+    tops = bar_tops(bucket_counts, scale)
+
+    def draw_bars() -> Image.Image:
+        layer = template['base'].copy()
+        draw = ImageDraw.Draw(layer)
+        box_width = 17 * scale
+        offset = 15 * scale
+        for top in tops:
+            draw.rectangle((offset, top, offset + box_width, layer.height + 1), fill='#678')
+            offset += box_width + 2 * scale
+        return layer
+
+    frame = get_bar_layer(('pil', scale, tops), draw_bars).copy()
+    width, height = frame.size
+
+    # Create a drawing object
+    draw = ImageDraw.Draw(frame)
+
+    # Draw the number of reviews text
+    text = str(count)
+    font = template['count_font']
+    text_bbox = draw.textbbox((0, 0), text, font=font)
+
+    draw.text((width - text_bbox[2] - 1 * scale, template['count_bottom'] - text_bbox[3]), text, font=font, fill='#678')
 
     # Append the frame to the list
     return frame
 
+# The static parts of a frame for the NumPy renderer: the base image as an
+# array, a full height bar to copy from, and the count font's digits
+# pre-rendered as alpha masks with their origin at (pad, pad)
+class ArrayTemplate(TypedDict):
+    base: np.ndarray
+    bar: np.ndarray
+    digit_masks: dict[str, np.ndarray]
+    digit_bboxes: dict[str, tuple[int, int, int, int]]
+    digit_advances: dict[str, int]
+    pad: int
+
+_array_templates: dict[int, ArrayTemplate] = {}
+
+# Converts the frame template to arrays and cuts the digits 0-9 out of the
+# count font, once per scale
+def get_array_template(scale: int) -> ArrayTemplate:
+    if scale in _array_templates:
+        return _array_templates[scale]
+
+    frame_template = get_frame_template(scale)
+    base = np.asarray(frame_template['base'])
+    bar = np.empty((base.shape[0], 17 * scale + 1, 3), dtype=np.uint8)
+    bar[:] = (0x66, 0x77, 0x88)
+
+    font = frame_template['count_font']
+    pad = 2 * scale
+    template: ArrayTemplate = {
+        'base': base,
+        'bar': bar,
+        'digit_masks': {},
+        'digit_bboxes': {},
+        'digit_advances': {},
+        'pad': pad,
+    }
+    for digit in '0123456789':
+        bbox = font.getbbox(digit)
+        # The digits are hinted, so they always advance by whole pixels and the
+        # same digit rasterizes identically wherever it sits in the number
+        glyph = Image.new('L', (bbox[2] + 2 * pad, bbox[3] + 2 * pad), 0)
+        ImageDraw.Draw(glyph).text((pad, pad), digit, font=font, fill=255)
+        template['digit_masks'][digit] = np.asarray(glyph)
+        template['digit_bboxes'][digit] = bbox
+        template['digit_advances'][digit] = int(font.getlength(digit))
+    _array_templates[scale] = template
+    return template
+
+# Blends a solid color into an image through an alpha mask, rounding the same
+# way that Pillow does when it draws text
+def blend_mask(region: np.ndarray, mask: np.ndarray, color: tuple[int, int, int]) -> None:
+    alpha = mask.astype(np.uint32)[:, :, None]
+    blended = region * (255 - alpha) + np.array(color, dtype=np.uint32) * alpha + 128
+    region[:] = ((blended >> 8) + blended) >> 8
+
+# The same frame as create_image, but with the bars copied straight into a
+# NumPy array and the count composed from pre-rendered digits. The output is
+# identical to create_image.
+def create_image_array(bucket_counts: Sequence[int], count: int, scale: int) -> np.ndarray:
+    template = get_array_template(scale)
+    tops = bar_tops(bucket_counts, scale)
+
+    # Bars fill down to the bottom of the frame, including both end columns
+    def draw_bars() -> np.ndarray:
+        layer = template['base'].copy()
+        bar = template['bar']
+        box_width = 17 * scale
+        offset = 15 * scale
+        for top in tops:
+            layer[top:, offset:offset + box_width + 1] = bar[top:]
+            offset += box_width + 2 * scale
+        return layer
+
+    frame = get_bar_layer(('numpy', scale, tops), draw_bars).copy()
+    height, width, _ = frame.shape
+
+    # Lay out the number of reviews text from the digit glyphs
+    pad = template['pad']
+    text = str(count)
+    text_width = sum(template['digit_advances'][digit] for digit in text)
+    text_bottom = max(template['digit_bboxes'][digit][3] for digit in text)
+    label = np.zeros((text_bottom + 2 * pad, text_width + 2 * pad), dtype=np.uint8)
+    pen = 0
+    for digit in text:
+        mask = template['digit_masks'][digit]
+        target = label[:mask.shape[0], pen:pen + mask.shape[1]]
+        np.maximum(target, mask[:, :target.shape[1]], out=target)
+        pen += template['digit_advances'][digit]
+
+    # Clip the label to the frame and blend it in
+    x = width - text_width - 1 * scale - pad
+    y = get_frame_template(scale)['count_bottom'] - text_bottom - pad
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + label.shape[1], width), min(y + label.shape[0], height)
+    blend_mask(frame[top:bottom, left:right], label[top - y:bottom - y, left - x:right - x], (0x66, 0x77, 0x88))
+
+    return frame
+
+# The day each row of the timeline was watched on, in days since the epoch
+def timeline_days(export: Export) -> np.ndarray:
+    order = np.argsort(export['watched_days'], kind='stable')
+    ratings = export['ratings'][order].astype(np.float64)
+    return np.asarray(export['watched_days'])[order][~np.isnan(ratings)]
+
+# Picks which rows of the timeline to show, as the distribution at the end of
+# each day, week (starting on Monday) or month, or at frame_budget evenly
+# spaced points in time. The last row is always shown. The rows are in order,
+# with none repeated.
+def sample_timeline(days: np.ndarray, frame_budget: Optional[int] = None, sample_every: Optional[str] = None) -> np.ndarray:
+    if sample_every is not None:
+        if sample_every == 'day':
+            periods = days
+        elif sample_every == 'week':
+            # 1970-01-01 was a Thursday
+            periods = (days + 3) // 7
+        elif sample_every == 'month':
+            periods = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        else:
+            raise ValueError(f'Unknown sampling period: {sample_every}')
+        return np.flatnonzero(np.append(periods[1:] != periods[:-1], True))
+
+    times = np.linspace(days[0], days[-1], max(frame_budget, 1))
+    rows = np.searchsorted(days, times, side='right') - 1
+    return np.unique(np.append(rows, len(days) - 1))
+
 # Define the easing function
 def ease(t: float) -> float:
     if t < 0.05:
@@ -112,78 +279,322 @@ def ease(t: float) -> float:
     else:
         return (t - 0.95) / 0.05
 
-# Takes in a list of movies and creates an animation
-def create_and_save_animation(movies: dict[str, list[Movie]]):
-    # Define the duration range (in seconds)
-    target_duration_seconds = 10
-    # How long to stay on the final frame for (in seconds)
-    final_frame_duration = 1
-    # MP4s don't loop by default. This allows you to calculate how many times
-    # the generated MP4 will 'loop' by having the same set of frames repeated.
-    num_loops = 1
-    # Scale the created video. With a default scale of 1 it will generate 
-    # a video with the dimensions of 256x80.
-    scale_image = 4
-    # How many frames to turn each frame into to give us wiggle room to ease
-    # duration. At a scale effect of 2 we have len(frames) extra frames to work
-    # with. Must be >= 1. Treat this as the "strength" of the easing function.
-    scale_effect: int = 2
-
-    animation_slices: list[dict[float, list[Movie]]] = []
-
-    current_buckets: dict[float, list[Movie]] = {
-        0.5: [],
-        1: [],
-        1.5: [],
-        2: [],
-        2.5: [],
-        3: [],
-        3.5: [],
-        4: [],
-        4.5: [],
-        5: [],
-    }
-    for key in sorted(movies.keys()):
-        day_list = movies[key]
-        for movie in day_list:
-            rating = movie['rating']
-            if rating is not None:
-                current_buckets[rating].append(movie)
-                animation_slices.append(copy.deepcopy(current_buckets))    
-
-    # Create a list to store frames
-    frames: list[Any] = []
-    for i, slice in enumerate(animation_slices):
-        frames.append(create_image(slice, i + 1, scale_image))
+# Calculates how many times each frame should be repeated so that playing them
+# back at a constant frame rate follows the easing function
+def frame_repetitions(num_frames: int, fps: int, scale_effect: int, final_frame_duration: float) -> list[int]:
+    # A single frame (e.g. a diary that's all in one sampled month) is just
+    # the final hold
+    if num_frames == 1:
+        return [int(fps * scale_effect * final_frame_duration)]
 
     # Calculate durations for each frame. Effectively this ends up just being
     # calculating the easing function for each frame
-    num_frames = len(frames)
     durations: list[float] = []
     for i in range(num_frames):
         t = i / (num_frames - 1)  # Normalized time between 0 and 1
         eased_t = ease(t)  # Apply easing function
         durations.append(eased_t)
 
-    # Calculate FPS
-    fps = round(len(movies) / target_duration_seconds)
-    
-    # Duplicate frames based on their durations
-    num_frames = len(frames)
     total_duration = sum(durations)
-    duplicated_frames: list[Any] = []
+    repetitions: list[int] = []
     for i in range(num_frames):
-        frame = frames[i]
-        t = i / (num_frames - 1)  # Normalized time between 0 and 1
         num_repetitions = int(1 + (durations[i] / total_duration) * ((scale_effect - 1) * num_frames))
 
         if i == num_frames - 1:
             num_repetitions = int(fps * scale_effect * final_frame_duration)
-        duplicated_frames.extend([frame] * num_repetitions)
+        repetitions.append(num_repetitions)
+    return repetitions
+
+# The shortest delay between GIF frames that browsers reliably honour. Anything
+# shorter gets slowed down to 100ms.
+GIF_FRAME_SECONDS = 0.02
+
+# Turns how many times each frame would be repeated at a constant frame rate
+# into how long it's displayed for in a GIF, so each frame only gets encoded
+# once. Frame changes are snapped to GIF_FRAME_SECONDS so the overall timing
+# doesn't drift, and frames that would be replaced before their first tick
+# are dropped. Returns the indices of the frames to keep and their durations
+# in milliseconds.
+def gif_frame_durations(repetitions: Sequence[int], fps: float) -> tuple[np.ndarray, np.ndarray]:
+    boundaries = np.concatenate([[0], np.cumsum(repetitions)]) / fps
+    ticks = np.diff(np.rint(boundaries / GIF_FRAME_SECONDS).astype(np.int64))
+    keep = np.flatnonzero(ticks > 0)
+    return keep, ticks[keep] * round(GIF_FRAME_SECONDS * 1000)
+
+# Builds a single palette for every frame of a GIF at this scale, from a frame
+# that has every digit in its count and bars of every height
+def gif_palette(scale: int) -> Image.Image:
+    sample = create_image_array(list(range(len(RATING_BUCKETS))), 1234567890, scale)
+    return Image.fromarray(sample).quantize(256)
+
+# Streams frames into a looping GIF, with each one shown for its own duration.
+# After the first frame only the rectangle that changed gets written, drawn
+# over the previous frame. Only quantizing and writing each frame is timed as
+# the 'encode' stage, since pulling frames from a lazy iterator renders them.
+def write_gif(path: str, frames: Iterator[np.ndarray], durations_ms: Sequence[int], palette: Image.Image, profile: Optional[Profile] = None):
+    if profile is None:
+        profile = Profile()
+    previous: Optional[np.ndarray] = None
+    with open(path, 'wb') as file:
+        for frame, duration in zip(frames, durations_ms):
+            with profile.stage('encode'):
+                image = Image.fromarray(frame).quantize(palette=palette, dither=Image.Dither.NONE)
+                indices = np.asarray(image)
+                if previous is None:
+                    header, _ = GifImagePlugin.getheader(image, info={'loop': 0, 'optimize': False})
+                    file.writelines(header)
+                    file.writelines(GifImagePlugin.getdata(image, duration=int(duration)))
+                else:
+                    changed = indices != previous
+                    rows = np.flatnonzero(changed.any(axis=1))
+                    columns = np.flatnonzero(changed.any(axis=0))
+                    if len(rows) == 0:
+                        # Nothing changed, so hold a single pixel from the last frame
+                        rows = columns = np.array([0])
+                    left, top = int(columns[0]), int(rows[0])
+                    region = image.crop((left, top, int(columns[-1]) + 1, int(rows[-1]) + 1))
+                    file.writelines(GifImagePlugin.getdata(region, offset=(left, top), duration=int(duration)))
+                previous = indices
+        file.write(b';')
+
+# Renders a single frame as an array with either the 'pil' or 'numpy' renderer
+def render_frame(bucket_counts: Sequence[int], count: int, scale: int, renderer: str = 'pil') -> np.ndarray:
+    if renderer == 'numpy':
+        return create_image_array(bucket_counts, count, scale)
+    elif renderer == 'pil':
+        return np.asarray(create_image(bucket_counts, count, scale))
+    raise ValueError(f'Unknown renderer: {renderer}')
+
+# Renders a contiguous range of the timeline. This runs in the worker processes,
+# so it's only sent the bucket counts and labels for its own frames
+def render_frame_range(bucket_counts: np.ndarray, labels: np.ndarray, scale: int, renderer: str = 'pil') -> list[np.ndarray]:
+    return [
+        render_frame(counts, label, scale, renderer)
+        for counts, label in zip(bucket_counts, labels.tolist())
+    ]
+
+# The fewest frames the process pool is allowed to render ahead of the encoder
+MIN_LOOKAHEAD_FRAMES = 16
+
+# Lazily renders the frame for each row of the timeline, so that only the frames
+# currently being encoded are held in memory. With more than one process the
+# timeline is split into ranges that are rendered in parallel, but frames are
+# still yielded in order. Each frame's count label is its row number, unless
+# labels are given for rows picked out of a longer timeline.
+def render_frames(timeline: np.ndarray, scale: int, processes: int = 1, frames_per_task: int = 8, renderer: str = 'pil', labels: Optional[np.ndarray] = None) -> Iterator[np.ndarray]:
+    if labels is None:
+        labels = np.arange(1, len(timeline) + 1)
+
+    if processes <= 1:
+        for bucket_counts, label in zip(timeline, labels.tolist()):
+            yield render_frame(bucket_counts, label, scale, renderer)
+        return
+
+    # Cap how many frames are rendered ahead of the encoder, whatever the
+    # number of processes. With lots of processes each range gets smaller, so
+    # that there are still two ranges queued per process and none sit idle.
+    lookahead_frames = max(2 * processes, MIN_LOOKAHEAD_FRAMES)
+    frames_per_task = max(1, min(frames_per_task, lookahead_frames // (2 * processes)))
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        starts = iter(range(0, len(timeline), frames_per_task))
+        pending: deque[Future[list[np.ndarray]]] = deque()
+
+        def submit_next() -> None:
+            start = next(starts, None)
+            if start is not None:
+                pending.append(executor.submit(
+                    render_frame_range, timeline[start:start + frames_per_task], labels[start:start + frames_per_task], scale, renderer,
+                ))
+
+        for _ in range(lookahead_frames // frames_per_task):
+            submit_next()
+        while pending:
+            frames = pending.popleft().result()
+            submit_next()
+            yield from frames
+
+# How many rows of the timeline go in each stored segment. Segments start at
+# fixed rows, so when the diary grows the ones whose frames didn't change are
+# still found in the store.
+SEGMENT_ROWS = 64
+
+# Saves the animation as an mp4 joined from segments in the frame store. Only
+# the segments that aren't stored yet get rendered and encoded, and they're
+# added to the store for next time.
+def save_from_frame_store(
+    frame_store: FrameStore,
+    timeline: np.ndarray,
+    labels: np.ndarray,
+    repetitions: Sequence[int],
+    fps: float,
+    scale: int,
+    profile: Profile,
+    render_processes: int = 1,
+    frames_per_task: int = 8,
+    renderer: str = 'pil',
+    num_loops: int = 1,
+    output_file: str = 'animation.mp4',
+):
+    repetitions = np.asarray(repetitions)
+    starts = range(0, len(timeline), SEGMENT_ROWS)
+    keys = [
+        frame_store.segment_key(timeline[start:start + SEGMENT_ROWS], labels[start:start + SEGMENT_ROWS], repetitions[start:start + SEGMENT_ROWS], scale, fps, RENDERER_VERSION)
+        for start in starts
+    ]
+    segments = [frame_store.get(key) for key in keys]
+    missing = [i for i, segment in enumerate(segments) if segment is None]
+
+    # Render every missing frame in one go, so a process pool only starts once
+    rows = np.array([row for i in missing for row in range(starts[i], min(starts[i] + SEGMENT_ROWS, len(timeline)))], dtype=np.int64)
+    frames = profile.time_frames(render_frames(timeline[rows], scale, render_processes, frames_per_task, renderer, labels[rows]))
+
+    for i in missing:
+        staging = frame_store.staging_path()
+        try:
+            writer = imageio.get_writer(staging, fps=fps)
+            try:
+                for row in range(starts[i], min(starts[i] + SEGMENT_ROWS, len(timeline))):
+                    frame = next(frames)
+                    with profile.stage('encode'):
+                        for _ in range(repetitions[row]):
+                            writer.append_data(frame)
+                    profile.count('frames_rendered')
+                    profile.count('frames_duplicated', int(repetitions[row]) - 1)
+            finally:
+                with profile.stage('encode'):
+                    writer.close()
+        except BaseException:
+            os.remove(staging)
+            raise
+        segments[i] = frame_store.put(keys[i], staging)
+
+    profile.count('segments_encoded', len(missing))
+    profile.count('segments_reused', len(segments) - len(missing))
+    with profile.stage('encode'):
+        concat_segments(segments * num_loops, output_file)
+    frame_store.evict()
+
+# Takes in the export and creates an animation. Pass an enabled Profile
+# to collect stage timings and frame counters for the run.
+def create_and_save_animation(
+    export: Export,
+    profile: Optional[Profile] = None,
+    # Define the duration range (in seconds)
+    target_duration_seconds: float = 10,
+    # How long to stay on the final frame for (in seconds)
+    final_frame_duration: float = 1,
+    # MP4s don't loop by default. This allows you to calculate how many times
+    # the generated MP4 will 'loop' by having the same set of frames repeated.
+    num_loops: int = 1,
+    # Scale the created video. With a default scale of 1 it will generate 
+    # a video with the dimensions of 256x80.
+    scale_image: int = 4,
+    # How many frames to turn each frame into to give us wiggle room to ease
+    # duration. At a scale effect of 2 we have len(frames) extra frames to work
+    # with. Must be >= 1. Treat this as the "strength" of the easing function.
+    scale_effect: int = 2,
+    # How many processes to render frames with, defaulting to one per CPU.
+    # Each one is sent ranges of up to frames_per_task frames at a time, and
+    # only a bounded number of frames are rendered ahead of the encoder.
+    render_processes: Optional[int] = None,
+    frames_per_task: int = 8,
+    # Which renderer to draw frames with. 'numpy' produces the same frames as
+    # 'pil' but writes the bars and count directly into an array.
+    renderer: str = 'numpy',
+    # Where to save the animation. A .gif gives each unique frame its own
+    # display time rather than repeating it, so every frame is only encoded
+    # once, and loops forever.
+    output_file: str = 'animation.mp4',
+    # By default there's a frame for every rating. To cap how many frames get
+    # rendered and encoded, give a number of frames (or a frame rate, which
+    # is turned into one over target_duration_seconds) to sample at evenly
+    # spaced points in time, or sample once every 'day', 'week' or 'month'.
+    # With frame_budget or sample_every, target_fps sets the frame rate
+    # instead. The easing still applies to the frames that are picked.
+    frame_budget: Optional[int] = None,
+    target_fps: Optional[float] = None,
+    sample_every: Optional[str] = None,
+    # Keeps encoded segments of the mp4 between runs, so that re-rendering a
+    # diary that's grown only renders and encodes the segments that changed.
+    # They're joined without re-encoding, so every segment starts on a
+    # keyframe and the file comes out slightly larger. Only for .mp4 output,
+    # and only with sample_every and a fixed target_fps, since otherwise the
+    # frames and frame rate shift whenever the diary grows.
+    frame_store: Optional[FrameStore] = None,
+):
+    if frame_store is not None and output_file.endswith('.gif'):
+        raise ValueError('The frame store only works with .mp4 output')
+    if frame_store is not None and (sample_every is None or target_fps is None):
+        raise ValueError('The frame store needs sample_every and a fixed target_fps')
+    if profile is None:
+        profile = Profile()
+    if render_processes is None:
+        render_processes = os.cpu_count() or 1
+
+    with profile.stage('timeline'):
+        timeline = build_timeline(export)
+        labels = np.arange(1, len(timeline) + 1)
+
+        if target_fps is not None and frame_budget is None and sample_every is None:
+            frame_budget = round(target_fps * target_duration_seconds)
+        if frame_budget is not None or sample_every is not None:
+            rows = sample_timeline(timeline_days(export), frame_budget, sample_every)
+            timeline, labels = timeline[rows], rows + 1
+
+    # Calculate FPS
+    if target_fps is not None:
+        fps = max(round(target_fps), 1)
+    elif frame_budget is not None or sample_every is not None:
+        fps = max(round(len(timeline) / target_duration_seconds), 1)
+    else:
+        fps = round(len(np.unique(export['watched_days'])) / target_duration_seconds)
+
+    # Work out the easing up front, so that frames can be streamed straight
+    # into the encoder instead of being collected and duplicated in memory
+    with profile.stage('easing'):
+        repetitions = frame_repetitions(len(timeline), fps, scale_effect, final_frame_duration)
+
+    # Save the frames as an animated GIF, where each frame has its own duration
+    # instead of being repeated
+    if output_file.endswith('.gif'):
+        keep, durations_ms = gif_frame_durations(repetitions, fps * scale_effect)
+        with profile.stage('palette'):
+            palette = gif_palette(scale_image)
+        frames = profile.time_frames(render_frames(timeline[keep], scale_image, render_processes, frames_per_task, renderer, labels[keep]))
+        with profile.cprofile():
+            write_gif(output_file, frames, durations_ms, palette, profile)
+        profile.count('frames_rendered', len(keep))
+        profile.count('bytes_encoded', os.path.getsize(output_file))
+        return
+
+    if frame_store is not None:
+        with profile.cprofile():
+            save_from_frame_store(
+                frame_store, timeline, labels, repetitions, fps * scale_effect, scale_image, profile,
+                render_processes, frames_per_task, renderer, num_loops, output_file,
+            )
+        profile.count('bytes_encoded', os.path.getsize(output_file))
+        return
 
     # Save the frames as an animated mp4
-    imageio.mimsave('animation.mp4', duplicated_frames * num_loops, fps=fps * scale_effect)
+    writer = imageio.get_writer(output_file, fps=fps * scale_effect)
+    try:
+        with profile.cprofile():
+            for _ in range(num_loops):
+                frames = profile.time_frames(render_frames(timeline, scale_image, render_processes, frames_per_task, renderer, labels))
+                for frame, num_repetitions in zip(frames, repetitions):
+                    with profile.stage('encode'):
+                        for _ in range(num_repetitions):
+                            writer.append_data(frame)
+                    profile.count('frames_rendered')
+                    profile.count('frames_duplicated', num_repetitions - 1)
+    finally:
+        with profile.stage('encode'):
+            writer.close()
+    profile.count('bytes_encoded', os.path.getsize(output_file))
 
-# Example usage
-movies = parse_letterboxd_history('export/diary.csv')
-create_and_save_animation(movies)
\ No newline at end of file
+if __name__ == '__main__':
+    import sys
+    from cli import main
+    main(['animate'] + sys.argv[1:])
\ No newline at end of file
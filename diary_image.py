@@ -0,0 +1,190 @@
+import math
+import numpy as np
+from typing import TypedDict, Optional
+from PIL import Image, ImageDraw, ImageFont
+from build_diary import Movie
+
+# The sizes the diary page lays its posters out with, in CSS pixels. These
+# match calculateGridLayout and the styles in build_diary.create_website.
+ELEMENT_WIDTH = 30
+ELEMENT_HEIGHT = 45
+PADDING = 10
+VERTICAL_ADD = 27 # the line of stars under each poster
+SCREEN_MARGIN_WIDTH = 30
+SCREEN_MARGIN_HEIGHT = 70
+PAGE_MARGIN_TOP = 20
+FONT_SIZE = 19.2 # 1.2em
+BADGE_WIDTH = 40
+BADGE_HEIGHT = 42
+
+BACKGROUND = (20, 24, 28)
+TEXT_COLOR = (85, 102, 119)
+POSTER_BORDER = (0xdd, 0xee, 0xff, 0x96)
+BADGE_SHADOW = (0, 0, 0, round(0.77 * 255))
+BADGE_COLOR = (0x1a, 0x5a, 0xb6, 255)
+
+class GridLayout(TypedDict):
+    columns: int
+    rows: int
+    width: float # of each poster, in CSS pixels
+    height: float
+
+# The same search as calculateGridLayout on the diary page: tries each number
+# of rows and keeps the one whose posters cover the most of the screen
+def calculate_grid_layout(num_movies: int, screen_width: float, screen_height: float) -> GridLayout:
+    screen_width -= SCREEN_MARGIN_WIDTH
+    screen_height -= SCREEN_MARGIN_HEIGHT
+
+    if screen_width / screen_height < ELEMENT_WIDTH / ELEMENT_HEIGHT:
+        min_row, max_row = math.floor(math.sqrt(num_movies)) - 1, num_movies
+    else:
+        min_row, max_row = 1, math.floor(math.sqrt(num_movies))
+
+    coverage = 0
+    layout: Optional[GridLayout] = None
+    # Zero rows never wins in the browser either, it just ends up as NaN there
+    for rows in range(max(min_row, 1), max_row + 1):
+        columns = math.ceil(num_movies / rows)
+
+        max_sized_width = (screen_width - (columns - 1) * PADDING) / columns
+        max_sized_height = (screen_height - (rows - 1) * PADDING - rows * VERTICAL_ADD) / rows
+
+        if max_sized_width * ELEMENT_HEIGHT / ELEMENT_WIDTH < max_sized_height:
+            width = max_sized_width
+            height = max_sized_width * ELEMENT_HEIGHT / ELEMENT_WIDTH
+        else:
+            width = max_sized_height * ELEMENT_WIDTH / ELEMENT_HEIGHT
+            height = max_sized_height
+
+        current_coverage = (width * columns) * (height * rows) / (screen_width * screen_height)
+        if current_coverage > coverage:
+            coverage = current_coverage
+            layout = {'columns': columns, 'rows': math.ceil(num_movies / columns), 'width': width, 'height': height}
+
+    if layout is None:
+        raise Exception(f"Can't fit {num_movies} posters on a {screen_width}x{screen_height} screen")
+    return layout
+
+# The text under a poster, the same as on the diary page
+def rating_text(rating: Optional[float]) -> str:
+    if rating is None:
+        return ''
+    return '★' * math.floor(rating) + ('½' if rating % 1 == 0.5 else '')
+
+_fonts: dict[int, ImageFont.FreeTypeFont] = {}
+
+def get_symbol_font(size: int) -> ImageFont.FreeTypeFont:
+    if size not in _fonts:
+        _fonts[size] = ImageFont.truetype("fonts/seguisym.ttf", size=size)
+    return _fonts[size]
+
+# A poster scaled to fill width x height, with rounded corners and the page's
+# translucent border
+def poster_tile(path: str, width: int, height: int, radius: int) -> Image.Image:
+    poster = Image.open(path)
+    # Let the JPEG decoder scale down on its own, which is much faster
+    poster.draft('RGB', (width, height))
+    poster = poster.convert('RGBA').resize((width, height), Image.Resampling.LANCZOS)
+
+    mask = Image.new('L', (width, height), 0)
+    ImageDraw.Draw(mask).rounded_rectangle((0, 0, width - 1, height - 1), radius=radius, fill=255)
+    poster.putalpha(mask)
+
+    border = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    ImageDraw.Draw(border).rounded_rectangle((0, 0, width - 1, height - 1), radius=radius, outline=POSTER_BORDER, width=max(1, radius // 4))
+    return Image.alpha_composite(poster, border)
+
+# The rewatch badge from the top right corner of a poster: a 45 degree
+# gradient that's clear for its bottom left half, then a thin shadow, then
+# blue, with a white arrow in the corner
+def rewatch_badge(pixel_ratio: float) -> Image.Image:
+    width, height = round(BADGE_WIDTH * pixel_ratio), round(BADGE_HEIGHT * pixel_ratio)
+    # Position along a CSS 45deg gradient line, from 0 at the bottom left
+    # corner to 1 at the top right
+    x, y = np.meshgrid(np.arange(width) + 0.5, np.arange(height) + 0.5)
+    length = (width + height) * math.sqrt(0.5)
+    position = ((x - width / 2) + (height / 2 - y)) * math.sqrt(0.5) / length + 0.5
+
+    pixels = np.zeros((height, width, 4), dtype=np.uint8)
+    pixels[position >= 0.5] = BADGE_SHADOW
+    pixels[position >= 0.53] = BADGE_COLOR
+    badge = Image.fromarray(pixels, 'RGBA')
+
+    # Round the top right corner like the poster
+    radius = round(4 * pixel_ratio)
+    corner = Image.new('L', (width, height), 0)
+    ImageDraw.Draw(corner).rounded_rectangle((-radius, 0, width - 1, height + radius), radius=radius, fill=255)
+    badge.putalpha(Image.fromarray(np.minimum(np.asarray(badge.getchannel('A')), np.asarray(corner))))
+
+    draw = ImageDraw.Draw(badge)
+    font = get_symbol_font(round(30 * pixel_ratio))
+    bbox = draw.textbbox((0, 0), '⟳', font=font)
+    draw.text((width - bbox[2] - 2 * pixel_ratio, 2 * pixel_ratio - bbox[1]), '⟳', font=font, fill='white')
+    return badge
+
+# The liked heart, which the page stretches to 1.3 times its width
+def liked_heart(size: int) -> Image.Image:
+    font = get_symbol_font(size)
+    bbox = font.getbbox('♥')
+    mask = Image.new('L', (bbox[2], bbox[3]), 0)
+    ImageDraw.Draw(mask).text((0, 0), '♥', font=font, fill=255)
+    mask = mask.crop((bbox[0], bbox[1], bbox[2], bbox[3]))
+    mask = mask.resize((round(mask.width * 1.3), mask.height), Image.Resampling.LANCZOS)
+    heart = Image.new('RGBA', mask.size, TEXT_COLOR + (255,))
+    heart.putalpha(mask)
+    return heart
+
+# Renders a month's diary straight to a PNG, laid out the way the page from
+# create_website lays itself out in a width x height window. posters maps each
+# movie's image URL to a local copy of it, e.g. from poster_thumbnails. The
+# pixel ratio scales everything up, like on a high DPI screen.
+def render_diary_image(
+    movies: dict[str, Movie],
+    posters: dict[str, str],
+    output_file: str = 'diary.png',
+    width: int = 1920,
+    height: int = 1080,
+    pixel_ratio: float = 1,
+):
+    image = Image.new('RGBA', (width, height), BACKGROUND + (255,))
+    # A month with nothing logged is just an empty page
+    if not movies:
+        image.convert('RGB').save(output_file, optimize=True)
+        return
+
+    layout = calculate_grid_layout(len(movies), width / pixel_ratio, height / pixel_ratio)
+    poster_width = round(layout['width'] * pixel_ratio)
+    poster_height = round(layout['height'] * pixel_ratio)
+    padding = round(PADDING * pixel_ratio)
+    row_height = poster_height + round(VERTICAL_ADD * pixel_ratio) + padding
+
+    grid_width = layout['columns'] * poster_width + (layout['columns'] - 1) * padding
+    left = (width - grid_width) // 2
+    top = round(PAGE_MARGIN_TOP * pixel_ratio)
+
+    draw = ImageDraw.Draw(image)
+    font = get_symbol_font(round(FONT_SIZE * pixel_ratio))
+    heart = liked_heart(round(FONT_SIZE * pixel_ratio))
+    badge = rewatch_badge(pixel_ratio)
+    radius = round(4 * pixel_ratio)
+
+    for i, movie in enumerate(movies.values()):
+        x = left + (i % layout['columns']) * (poster_width + padding)
+        y = top + (i // layout['columns']) * row_height
+
+        if movie.get('image') in posters:
+            image.alpha_composite(poster_tile(posters[movie['image']], poster_width, poster_height, radius), (x, y))
+        if movie['rewatched']:
+            image.alpha_composite(badge, (x + poster_width - badge.width, y))
+
+        text = rating_text(movie['rating'])
+        text_top = y + poster_height + round(2 * pixel_ratio)
+        text_right = x
+        if text:
+            draw.text((x, text_top), text, font=font, fill=TEXT_COLOR)
+            text_right = x + round(draw.textlength(text, font=font))
+        if movie['liked']:
+            heart_top = text_top + font.getbbox('★')[3] - heart.height
+            image.alpha_composite(heart, (text_right + round(3 * pixel_ratio), max(heart_top, 0)))
+
+    image.convert('RGB').save(output_file, optimize=True)
@@ -0,0 +1,77 @@
+import hashlib, os, subprocess, tempfile
+import numpy as np
+from typing import Optional
+from web_cache import evict_least_recently_used
+
+# The folder that encoded segments of animations are kept in
+FRAME_STORE_DIR = os.path.join('.cache', 'frames')
+
+# Keeps encoded runs of animation frames on disk between runs. A segment is
+# keyed by everything that goes into its frames: the bar counts and count
+# label of each frame, how many times each one is repeated, the scale, frame
+# rate and renderer version. When a diary grows, only the segments whose
+# frames changed need rendering and encoding again. Once the store grows past
+# max_bytes, the least recently used segments are evicted.
+class FrameStore:
+    def __init__(self, directory: str = FRAME_STORE_DIR, max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def segment_key(
+        bucket_counts: np.ndarray,
+        labels: np.ndarray,
+        repetitions: np.ndarray,
+        scale: int,
+        fps: float,
+        renderer_version: int,
+    ) -> str:
+        digest = hashlib.sha1(f'v{renderer_version}:{scale}:{fps}:'.encode())
+        for values in [bucket_counts, labels, repetitions]:
+            digest.update(np.ascontiguousarray(values, dtype=np.int64).tobytes())
+            digest.update(b'\x1e')
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.mp4')
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        # Reading a segment counts as using it, for eviction
+        os.utime(path)
+        return path
+
+    # A temporary path in the store to encode a segment into, before put()
+    # moves it into place so a half written segment is never used
+    def staging_path(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, staging = tempfile.mkstemp(dir=self.directory, suffix='.tmp.mp4')
+        os.close(descriptor)
+        return staging
+
+    def put(self, key: str, staging: str) -> str:
+        os.replace(staging, self.path(key))
+        return self.path(key)
+
+    def evict(self):
+        evict_least_recently_used(self.directory, self.max_bytes)
+
+# Joins encoded segments into one video without re-encoding them. They have to
+# have all been encoded with the same settings.
+def concat_segments(segments: list[str], output_file: str):
+    import imageio_ffmpeg
+
+    descriptor, list_file = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            for segment in segments:
+                escaped = os.path.abspath(segment).replace("'", "'\\''")
+                file.write(f"file '{escaped}'\n")
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_file, '-c', 'copy', output_file],
+            check=True,
+        )
+    finally:
+        os.remove(list_file)
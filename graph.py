@@ -1,158 +1,220 @@
-import csv, copy, math, requests
-from typing import TypedDict, Optional, Any
-from bs4 import BeautifulSoup
+import hashlib, os, time
 from typing import TypedDict, Optional
+import numpy as np
 import plotly.graph_objects as go
-from collections import defaultdict
 import pandas as pd
-
-class Movie(TypedDict):
-    rating: Optional[float] # out of 5
-    watched_date: str
-    liked: bool
-    rewatched: bool
-    tags: list[str]
-    
-# Takes in a CSV file and returns the list of movies
-def parse_letterboxd_history(diary_file: str, likes_file: str) -> dict[str, Movie]:
-    movies: dict[str, Movie] = {}
-
-    with open(diary_file, newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            watched_date = row['Watched Date']
-            name = row['Name']
-            year = row['Year']
-            rewatched = (row['Rewatch'] == 'Yes')
-            if row['Rating'] == '':
-                rating = None
-            else:
-                rating = float(row['Rating'])
-            tags = row['Tags'].split(', ')
-
-            movies[f'{name} ({year})'] = {
-                'rating': rating,
-                'watched_date': watched_date,
-                'liked': False, # default to false
-                'rewatched': rewatched,
-                'tags': tags,
-            }
-
-    # Mark liked movies
-    with open(likes_file, newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            name = row['Name']
-            year = row['Year']
-
-            index_name = f'{name} ({year})'
-
-            if index_name in movies:
-                movies[index_name]['liked'] = True
-
-    return movies
-  
-def get_watchlist(watchlist_file):
-  watchlist = []
-    # Mark liked movies
-  with open(watchlist_file, newline='', encoding='utf-8') as file:
-      reader = csv.DictReader(file)
-      for row in reader:
-          watchlist.append({
-            'watched_date': row['Date'],
-          })
-
-  return watchlist
-  
-movies = parse_letterboxd_history('export/diary.csv', 'export/likes/films.csv').values()
-watchlist = get_watchlist('export/watchlist.csv')
-
-# Convert data into a DataFrame
-df = pd.DataFrame(movies)
-df['watched_date'] = pd.to_datetime(df['watched_date'])
-df['rating'] = df['rating'].fillna(-1)
-
-# Watchlist
-df2 = pd.DataFrame(watchlist)
-df2['watched_date'] = pd.to_datetime(df2['watched_date'])
-grouped2 = df2.groupby('watched_date')
-date_to_group_watchlist = {date: group for date, group in grouped2}
-
-# Group by date
-grouped = df.groupby('watched_date')
-dates = []
-total_count = []
-liked_count = []
-rewatched_count = []
-watchlist_count = []
-rating_counts = defaultdict(list)
-tag_counts = defaultdict(list)
-
-cumulative_total = 0
-cumulative_liked = 0
-cumulative_rewatched = 0
-cumulative_watchlist = 0
-cumulative_ratings = defaultdict(int)
-cumulative_tags = defaultdict(int)
-
-all_dates = pd.date_range(start=df['watched_date'].min(), end=df['watched_date'].max())
-date_to_group = {date: group for date, group in grouped}
-
-for date in all_dates:
-  dates.append(date)
-  if date in date_to_group:
-    group = date_to_group[date]
-    cumulative_total += len(group)
-    cumulative_liked += group['liked'].sum()
-    cumulative_rewatched += group['rewatched'].sum()
-
-    all_tags = sum(group['tags'].tolist(), [])
-    for tag in set(all_tags):
-      count = all_tags.count(tag)
-      cumulative_tags[tag] += count
-
-    for rating in group['rating'].unique():
-      count = len(group[group['rating'] == rating])
-      cumulative_ratings[rating] += count
-      
-  if date in date_to_group_watchlist:
-    cumulative_watchlist += len(date_to_group_watchlist[date])
-
-  total_count.append(cumulative_total)
-  liked_count.append(cumulative_liked)
-  rewatched_count.append(cumulative_rewatched)
-  watchlist_count.append(cumulative_watchlist)
-
-  for rating in cumulative_ratings:
-    rating_counts[rating].append(cumulative_ratings[rating])
-
-  for tag in cumulative_tags:
-    tag_counts[tag].append(cumulative_tags[tag])
-
-# Fill gaps with zeros for ratings and tags before their first appearance
-for rating in rating_counts:
-  while len(rating_counts[rating]) < len(dates):
-    rating_counts[rating].insert(0, 0)
-
-for tag in tag_counts:
-  while len(tag_counts[tag]) < len(dates):
-    tag_counts[tag].insert(0, 0)
-
-# Plot
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=dates, y=total_count, mode='lines', name='Total'))
-fig.add_trace(go.Scatter(x=dates, y=liked_count, mode='lines', name='Liked'))
-fig.add_trace(go.Scatter(x=dates, y=rewatched_count, mode='lines', name='Rewatched'))
-fig.add_trace(go.Scatter(x=dates, y=watchlist_count, mode='lines', name='Watchlist'))
-
-for rating, counts in rating_counts.items():
-  if rating != -1:
-    fig.add_trace(go.Scatter(x=dates, y=counts, mode='lines', name=f'Rating {rating}'))
-
-for tag, counts in tag_counts.items():
-  fig.add_trace(go.Scatter(x=dates, y=counts, mode='lines', name=f'Tag {tag}'))
-
-fig.update_layout(title='Movies Watched Over Time (Cumulative)', xaxis_title='Date', yaxis_title='Number of Movies')
-
-# Save as HTML
-fig.write_html('movies_graph.html')
+from letterboxd_export import Export, latest_entries
+
+# The cumulative number of films on each day between the first and last diary
+# entries: the totals, and one column per rating and per tag. Columns are in
+# the order that each rating or tag first appears.
+class CumulativeSeries(TypedDict):
+  dates: pd.DatetimeIndex
+  totals: pd.DataFrame # Total, Liked, Rewatched and Watchlist
+  ratings: pd.DataFrame # -1 for films without a rating
+  tags: pd.DataFrame
+
+def to_dates(days: np.ndarray) -> np.ndarray:
+  return days.astype('datetime64[D]').astype('datetime64[ns]')
+
+# Counts how many rows land on each day in dates, with one column per key in
+# order of first appearance, and accumulates them
+def cumulative_counts(row_dates: np.ndarray, keys: np.ndarray, dates: pd.DatetimeIndex) -> pd.DataFrame:
+  rows = pd.DataFrame({'date': row_dates, 'key': keys}).sort_values('date', kind='stable')
+  order = rows['key'].drop_duplicates()
+  daily = rows.groupby(['date', 'key'], sort=False).size().unstack(fill_value=0)
+  return daily.reindex(index=dates, columns=order, fill_value=0).cumsum()
+
+# Builds every cumulative series in one pass over the export, counting the
+# latest diary entry for each film. If after is given (in days since the
+# epoch), only the days after it are counted, starting from zero.
+def cumulative_series(export: Export, after: Optional[int] = None) -> CumulativeSeries:
+  latest = latest_entries(export)
+  if after is not None:
+    latest = latest[export['watched_days'][latest] > after]
+  watched = to_dates(export['watched_days'][latest])
+  start = watched.min() if after is None else to_dates(np.array([after + 1]))[0]
+  dates = pd.date_range(start=start, end=watched.max())
+
+  def per_day(row_dates: np.ndarray, weights: Optional[np.ndarray] = None) -> pd.Series:
+    daily = pd.Series(1 if weights is None else weights, index=row_dates).groupby(level=0).sum()
+    return daily.reindex(dates, fill_value=0).cumsum()
+
+  totals = pd.DataFrame({
+    'Total': per_day(watched),
+    'Liked': per_day(watched, export['liked'][latest].astype(np.int64)),
+    'Rewatched': per_day(watched, export['rewatched'][latest].astype(np.int64)),
+    # Films added to the watchlist outside of the diary's dates aren't counted
+    'Watchlist': per_day(to_dates(export['watchlist_days'])),
+  }, index=dates)
+
+  ratings = np.nan_to_num(export['ratings'][latest].astype(float), nan=-1)
+
+  # Only the tags on each film's latest entry count
+  is_latest = np.zeros(len(export['names']), dtype=bool)
+  is_latest[latest] = True
+  tagged = is_latest[export['tag_rows']]
+  tag_rows = export['tag_rows'][tagged]
+
+  return {
+    'dates': dates,
+    'totals': totals,
+    'ratings': cumulative_counts(watched, ratings, dates),
+    'tags': cumulative_counts(to_dates(export['watched_days'][tag_rows]), export['tag_names'][export['tag_ids'][tagged]], dates),
+  }
+
+# Bump this whenever the checkpoint's contents change, so old ones get ignored
+CHECKPOINT_VERSION = 1
+
+# The series from a previous run, and what they were built from
+class Checkpoint(TypedDict):
+  version: int
+  last_day: int # days since the epoch
+  history_hash: str
+  series: CumulativeSeries
+
+# Hashes every diary and watchlist row up to and including last_day, so that
+# edits to or deletions of entries that are already in the series can be spotted
+def history_hash(export: Export, last_day: int) -> str:
+  history = export['watched_days'] <= last_day
+  digest = hashlib.sha1()
+  for column in ['names', 'years', 'watched_days', 'ratings', 'liked', 'rewatched']:
+    digest.update('\x1f'.join(map(str, export[column][history].tolist())).encode())
+    digest.update(b'\x1e')
+
+  # Tags are hashed by their row's position among the historical rows
+  history_rows = np.cumsum(history) - 1
+  tagged = history[export['tag_rows']]
+  tag_pairs = zip(history_rows[export['tag_rows'][tagged]].tolist(), export['tag_names'][export['tag_ids'][tagged]].tolist())
+  digest.update('\x1f'.join(f'{row}:{tag}' for row, tag in tag_pairs).encode())
+  digest.update(b'\x1e')
+
+  watchlist_days = np.sort(export['watchlist_days'][export['watchlist_days'] <= last_day])
+  digest.update(watchlist_days.astype(np.int32).tobytes())
+  return digest.hexdigest()
+
+# Adds series covering the days after old's onto the end of old. New ratings
+# and tags are zero before they first appeared, and every column carries on
+# from its last value in old.
+def append_series(old: CumulativeSeries, new: CumulativeSeries) -> CumulativeSeries:
+  def append(old_counts: pd.DataFrame, new_counts: pd.DataFrame) -> pd.DataFrame:
+    columns = list(old_counts.columns) + [column for column in new_counts.columns if column not in old_counts.columns]
+    last = old_counts.iloc[-1].reindex(columns, fill_value=0)
+    new_counts = new_counts.reindex(columns=columns, fill_value=0) + last
+    return pd.concat([old_counts.reindex(columns=columns, fill_value=0), new_counts]).astype(np.int64)
+
+  return {
+    'dates': old['dates'].append(new['dates']),
+    'totals': append(old['totals'], new['totals']),
+    'ratings': append(old['ratings'], new['ratings']),
+    'tags': append(old['tags'], new['tags']),
+  }
+
+# Builds the cumulative series, picking up from the checkpoint of a previous
+# run when the only changes to the export are entries after its last day.
+# Anything else, like an edited or deleted entry, a rewatch of a film that's
+# already counted, or a watchlist change, rebuilds the series from scratch.
+# The checkpoint is then updated for the next run.
+def update_series(export: Export, checkpoint_file: str) -> CumulativeSeries:
+  checkpoint: Optional[Checkpoint] = None
+  if os.path.exists(checkpoint_file):
+    checkpoint = pd.read_pickle(checkpoint_file)
+    if checkpoint is None or checkpoint.get('version') != CHECKPOINT_VERSION:
+      checkpoint = None
+
+  series: Optional[CumulativeSeries] = None
+  if checkpoint is not None and history_hash(export, checkpoint['last_day']) == checkpoint['history_hash']:
+    last_day = checkpoint['last_day']
+    is_new = export['watched_days'] > last_day
+    history_films = set(zip(export['names'][~is_new].tolist(), export['years'][~is_new].tolist()))
+    new_films = zip(export['names'][is_new].tolist(), export['years'][is_new].tolist())
+    if not is_new.any():
+      series = checkpoint['series']
+    elif not any(film in history_films for film in new_films):
+      series = append_series(checkpoint['series'], cumulative_series(export, last_day))
+
+  if series is None:
+    series = cumulative_series(export)
+
+  last_day = int(series['dates'][-1].to_datetime64().astype('datetime64[D]').astype(np.int64))
+  pd.to_pickle({
+    'version': CHECKPOINT_VERSION,
+    'last_day': last_day,
+    'history_hash': history_hash(export, last_day),
+    'series': series,
+  }, checkpoint_file)
+  return series
+
+# Only keeps the days where a cumulative series changes, plus its first and
+# last day. Drawn as a step line this is exactly the same shape as plotting
+# every day.
+def change_points(counts: pd.Series) -> pd.Series:
+  values = counts.to_numpy()
+  keep = np.ones(len(values), dtype=bool)
+  keep[1:-1] = values[1:-1] != values[:-2]
+  return counts[keep]
+
+# Creates the trace for one series. In the scalable mode it's drawn with
+# WebGL, only has the points where the series changes, and has its dates as
+# milliseconds since the epoch, so that both axes get sent as typed arrays
+# rather than lists of strings.
+def make_trace(name: str, counts: pd.Series, scalable: bool) -> go.Scatter | go.Scattergl:
+  if not scalable:
+    return go.Scatter(x=counts.index, y=counts.to_numpy(), mode='lines', name=name)
+
+  counts = change_points(counts)
+  epoch_ms = counts.index.to_numpy().astype('datetime64[ms]').astype(np.float64)
+  return go.Scattergl(x=epoch_ms, y=counts.to_numpy(dtype=np.int32), mode='lines', line_shape='hv', name=name)
+
+# Plots the export's cumulative series and saves them as an HTML graph
+def create_graph(
+  export: Export,
+  output_file: str = 'movies_graph.html',
+  # Where to keep the series between runs, so that only new diary entries
+  # need to be counted next time. None to always count everything.
+  checkpoint_file: Optional[str] = 'movies_graph.checkpoint.pkl',
+  # The scalable mode draws with WebGL, only plots the days where a series
+  # changes and sends the data as typed arrays, which keeps the HTML small
+  # and the browser responsive on long diaries
+  scalable_output: bool = True,
+  # Only plot this many of the most used tags, or all of them if None
+  max_tags: Optional[int] = 20,
+):
+  if checkpoint_file is None:
+    series = cumulative_series(export)
+  else:
+    series = update_series(export, checkpoint_file)
+
+  start = time.perf_counter()
+
+  tags = series['tags']
+  if max_tags is not None and len(tags.columns) > max_tags:
+    most_used = set(tags.iloc[-1].nlargest(max_tags).index)
+    tags = tags[[tag for tag in tags.columns if tag in most_used]]
+
+  # Plot
+  fig = go.Figure()
+  for name, counts in series['totals'].items():
+    fig.add_trace(make_trace(name, counts, scalable_output))
+
+  for rating, counts in series['ratings'].items():
+    if rating != -1:
+      fig.add_trace(make_trace(f'Rating {rating}', counts, scalable_output))
+
+  for tag, counts in tags.items():
+    fig.add_trace(make_trace(f'Tag {tag}', counts, scalable_output))
+
+  fig.update_layout(title='Movies Watched Over Time (Cumulative)', xaxis_title='Date', yaxis_title='Number of Movies')
+  if scalable_output:
+    fig.update_xaxes(type='date')
+
+  # Save as HTML
+  fig.write_html(output_file)
+
+  print(f'Wrote {output_file} ({os.path.getsize(output_file) / 1024:.0f} KB) in {time.perf_counter() - start:.2f}s')
+  return fig
+
+if __name__ == '__main__':
+  import sys
+  from cli import main
+  main(['graph'] + sys.argv[1:])
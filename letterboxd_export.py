@@ -0,0 +1,198 @@
+import csv, hashlib, io, os, shutil, tempfile, zipfile
+import numpy as np
+from typing import TypedDict, Optional
+
+# Bump this whenever the columns below change, so stale caches get rebuilt
+CACHE_VERSION = 1
+# The folder inside the export that parsed columns are cached in
+CACHE_DIR = '.cache'
+
+# A Letterboxd export parsed into columns, with one entry per diary row in the
+# order that they appear in diary.csv
+class Export(TypedDict):
+    names: np.ndarray # str
+    years: np.ndarray # str
+    uris: np.ndarray # str
+    watched_days: np.ndarray # int32, days since 1970-01-01
+    ratings: np.ndarray # float16 out of 5, NaN when there's no rating
+    liked: np.ndarray # bool
+    rewatched: np.ndarray # bool
+    # Tags are stored flattened. Tag i belongs to diary row tag_rows[i] and is
+    # named tag_names[tag_ids[i]].
+    tag_names: np.ndarray # str
+    tag_rows: np.ndarray # int32
+    tag_ids: np.ndarray # int32
+    watchlist_days: np.ndarray # int32, days since 1970-01-01 each film was added
+
+# The columns that are stored packed as bits in the cache
+BITMAP_COLUMNS = ['liked', 'rewatched']
+
+def export_files(export_dir: str) -> list[str]:
+    return [
+        os.path.join(export_dir, 'diary.csv'),
+        os.path.join(export_dir, 'likes', 'films.csv'),
+        os.path.join(export_dir, 'watchlist.csv'),
+    ]
+
+# Hashes the size, modification time and contents of every file in the export,
+# so that any change to them gets a fresh cache entry
+def cache_key(export_dir: str) -> str:
+    digest = hashlib.sha1(f'v{CACHE_VERSION}'.encode())
+    for path in export_files(export_dir):
+        if not os.path.exists(path):
+            digest.update(b'missing')
+            continue
+        stat = os.stat(path)
+        digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode())
+        with open(path, 'rb') as file:
+            digest.update(hashlib.sha1(file.read()).digest())
+    return digest.hexdigest()
+
+def to_days(dates: list[str]) -> np.ndarray:
+    return np.array(dates, dtype='datetime64[D]').astype(np.int32)
+
+# Finds a file in an export .zip, which may have its files at the top or in
+# a single folder. Exports also have folders like deleted/ and orphaned/ with
+# their own diary.csv, so only a file at the top, or one folder down when the
+# whole export is in that folder, counts.
+def archive_member(archive: zipfile.ZipFile, path: str) -> Optional[str]:
+    names = archive.namelist()
+    if path in names:
+        return path
+    folders = {name.split('/', 1)[0] for name in names if '/' in name}
+    files = [name for name in names if '/' not in name]
+    if len(folders) == 1 and not files:
+        name = f'{folders.pop()}/{path}'
+        if name in names:
+            return name
+    return None
+
+# Reads the rows of a CSV from the export as lists, with a lookup from column
+# name to index. Missing files (e.g. an account with no likes) have no rows,
+# unless they're required. With an archive, the CSV is read straight out of it.
+def read_rows(path: str, archive: Optional[zipfile.ZipFile] = None, required: bool = False) -> tuple[dict[str, int], list[list[str]]]:
+    if archive is not None:
+        member = archive_member(archive, path)
+        if member is None:
+            if required:
+                raise FileNotFoundError(f'No {path} in {archive.filename}')
+            return {}, []
+        file = io.TextIOWrapper(archive.open(member), encoding='utf-8', newline='')
+    elif os.path.exists(path):
+        file = open(path, newline='', encoding='utf-8')
+    else:
+        if required:
+            raise FileNotFoundError(f'No such export file: {path}')
+        return {}, []
+    with file:
+        reader = csv.reader(file)
+        header = next(reader, [])
+        return {name: i for i, name in enumerate(header)}, list(reader)
+
+# Whether an export is a .zip rather than a folder. Anything named .zip counts,
+# so that a corrupt download gets reported as one instead of as a missing folder.
+def is_archive(export_path: str) -> bool:
+    return export_path.lower().endswith('.zip') or zipfile.is_zipfile(export_path)
+
+# Parses the export's CSVs into columns. The export can be a folder, or the
+# .zip that Letterboxd hands out, which is read without extracting it.
+def parse_export(export_dir: str) -> Export:
+    if is_archive(export_dir):
+        if not zipfile.is_zipfile(export_dir):
+            raise zipfile.BadZipFile(f'{export_dir} is not a valid export archive')
+        with zipfile.ZipFile(export_dir) as archive:
+            return parse_export_files(export_files(''), archive)
+    return parse_export_files(export_files(export_dir))
+
+def parse_export_files(files: list[str], archive: Optional[zipfile.ZipFile] = None) -> Export:
+    diary_file, likes_file, watchlist_file = files
+
+    columns, rows = read_rows(diary_file, archive, required=True)
+    name, year, uri = columns.get('Name'), columns.get('Year'), columns.get('Letterboxd URI')
+    rating, rewatch, tags = columns.get('Rating'), columns.get('Rewatch'), columns.get('Tags')
+    watched_date = columns.get('Watched Date')
+
+    tag_lookup: dict[str, int] = {}
+    tag_rows: list[int] = []
+    tag_ids: list[int] = []
+    for i, row in enumerate(rows):
+        if row[tags] == '':
+            continue
+        for tag in row[tags].split(', '):
+            tag_rows.append(i)
+            tag_ids.append(tag_lookup.setdefault(tag, len(tag_lookup)))
+
+    names = np.array([row[name] for row in rows], dtype=str)
+    years = np.array([row[year] for row in rows], dtype=str)
+
+    # Likes are matched to diary rows by name and year
+    like_columns, like_rows = read_rows(likes_file, archive)
+    liked_films = {(row[like_columns['Name']], row[like_columns['Year']]) for row in like_rows}
+
+    watchlist_columns, watchlist_rows = read_rows(watchlist_file, archive)
+
+    return {
+        'names': names,
+        'years': years,
+        'uris': np.array([row[uri] for row in rows], dtype=str),
+        'watched_days': to_days([row[watched_date] for row in rows]),
+        'ratings': np.array([float(row[rating]) if row[rating] != '' else np.nan for row in rows], dtype=np.float16),
+        'liked': np.array([(row[name], row[year]) in liked_films for row in rows], dtype=bool),
+        'rewatched': np.array([row[rewatch] == 'Yes' for row in rows], dtype=bool),
+        'tag_names': np.array(list(tag_lookup), dtype=str),
+        'tag_rows': np.array(tag_rows, dtype=np.int32),
+        'tag_ids': np.array(tag_ids, dtype=np.int32),
+        'watchlist_days': to_days([row[watchlist_columns['Date']] for row in watchlist_rows]),
+    }
+
+def save_cache(export: Export, directory: str):
+    # Write into a temporary folder first so a half written cache is never read
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent)
+    for column, values in export.items():
+        if column in BITMAP_COLUMNS:
+            np.save(os.path.join(staging, f'{column}.npy'), np.packbits(values))
+        else:
+            np.save(os.path.join(staging, f'{column}.npy'), values)
+    os.replace(staging, directory)
+
+def load_cache(directory: str) -> Export:
+    export = {
+        column: np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r')
+        for column in Export.__annotations__
+    }
+    num_rows = len(export['names'])
+    for column in BITMAP_COLUMNS:
+        export[column] = np.unpackbits(export[column], count=num_rows).astype(bool)
+    return export # type: ignore[return-value]
+
+# Loads the export in export_dir, using the cached columns if the CSVs haven't
+# changed since they were last parsed. Cached columns are memory mapped.
+# Exports still in their .zip are always parsed, since there's no folder to
+# keep a cache in.
+def load_export(export_dir: str = 'export', use_cache: bool = True) -> Export:
+    # The cache lives inside the export folder, so there has to be one
+    if not use_cache or is_archive(export_dir) or not os.path.isdir(export_dir):
+        return parse_export(export_dir)
+
+    cache_root = os.path.join(export_dir, CACHE_DIR)
+    directory = os.path.join(cache_root, cache_key(export_dir))
+    if os.path.isdir(directory):
+        return load_cache(directory)
+
+    export = parse_export(export_dir)
+    # Only the latest version of the export is worth keeping around
+    if os.path.isdir(cache_root):
+        for entry in os.listdir(cache_root):
+            shutil.rmtree(os.path.join(cache_root, entry), ignore_errors=True)
+    save_cache(export, directory)
+    return export
+
+# The index of the last diary row for each film (by name and year), in order of
+# each film's first appearance. Rewatches replace earlier entries for a film.
+def latest_entries(export: Export) -> np.ndarray:
+    latest: dict[tuple[str, str], int] = {}
+    for i, (name, year) in enumerate(zip(export['names'].tolist(), export['years'].tolist())):
+        latest[(name, year)] = i
+    return np.array(list(latest.values()), dtype=np.int64)
@@ -0,0 +1,97 @@
+from html.parser import HTMLParser
+from typing import TypedDict, Optional
+
+# The fields of one row of a diary page that the diary builder needs
+class DiaryRow(TypedDict):
+    slug: str
+    name: str
+    year: str
+
+# A diary page boiled down to its rows, in order, and how many pages the
+# month's diary has
+class DiaryPage(TypedDict):
+    rows: list[DiaryRow]
+    page_count: int
+
+def has_class(attrs: list[tuple[str, Optional[str]]], name: str) -> bool:
+    return any(key == 'class' and value is not None and name in value.split() for key, value in attrs)
+
+# Streams through a diary page picking out each tr.diary-entry-row's film slug
+# (from div.linked-film-poster), the title from its h3.headline-3 and the
+# release year from its td.td-released, plus the numbers of the pagination
+# links. Nothing else is kept, and no tree is built.
+class DiaryPageParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows: list[DiaryRow] = []
+        self.page_count = 1
+        self.row: Optional[dict[str, str]] = None
+        # The field the next piece of text is read into, once the element
+        # holding it has opened a child (the title and year sit in an <a> and
+        # a <span>)
+        self.pending: Optional[str] = None
+        self.pending_tag = ''
+        self.in_child = False
+        self.in_page_link = False
+
+    def read(self, field: str, tag: str):
+        self.pending = field
+        self.pending_tag = tag
+        self.in_child = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]):
+        if self.pending is not None:
+            self.in_child = True
+        if tag == 'tr' and has_class(attrs, 'diary-entry-row'):
+            self.row = {}
+        elif self.row is not None:
+            if 'slug' not in self.row and has_class(attrs, 'linked-film-poster'):
+                self.row['slug'] = dict(attrs).get('data-film-slug') or ''
+            elif tag == 'h3' and 'name' not in self.row and has_class(attrs, 'headline-3'):
+                self.read('name', tag)
+            elif tag == 'td' and 'year' not in self.row and has_class(attrs, 'td-released'):
+                self.read('year', tag)
+        elif tag == 'li' and has_class(attrs, 'paginate-page'):
+            self.in_page_link = True
+
+    def handle_endtag(self, tag: str):
+        if self.pending is not None and tag == self.pending_tag:
+            self.pending = None
+        if tag == 'tr' and self.row is not None:
+            if 'slug' in self.row and 'name' in self.row and 'year' in self.row:
+                self.rows.append({'slug': self.row['slug'], 'name': self.row['name'], 'year': self.row['year']})
+            self.row = None
+        elif tag == 'li':
+            self.in_page_link = False
+
+    def handle_data(self, data: str):
+        if self.pending is not None and self.in_child and self.row is not None:
+            self.row[self.pending] = data
+            self.pending = None
+        elif self.in_page_link and data.strip().isdigit():
+            self.page_count = max(self.page_count, int(data))
+
+def parse_diary_page(page: str) -> DiaryPage:
+    parser = DiaryPageParser()
+    parser.feed(page)
+    parser.close()
+    return {'rows': parser.rows, 'page_count': parser.page_count}
+
+# Stops at the first img.image in a poster fragment and keeps its src
+class PosterParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.src: Optional[str] = None
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]):
+        if self.src is None and tag == 'img' and has_class(attrs, 'image'):
+            self.src = dict(attrs).get('src')
+
+# The poster URL in a film's poster fragment
+def poster_src(fragment: str) -> str:
+    parser = PosterParser()
+    parser.feed(fragment)
+    parser.close()
+    if parser.src is None:
+        raise Exception('No poster in the fragment')
+    return parser.src
@@ -0,0 +1,84 @@
+import hashlib, os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional
+from PIL import Image
+from build_diary import make_session
+
+# The widths that posters are resized to, and the formats each one is saved
+# in. Browsers that support WebP get it, and the rest fall back to JPEG.
+THUMBNAIL_WIDTHS = [150, 300, 500]
+THUMBNAIL_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+# Posters are 2:3
+POSTER_ASPECT_RATIO = 1.5
+
+# Each poster's resized copies, as (width, path) by format from narrowest to
+# widest
+PosterVariants = dict[str, list[tuple[int, str]]]
+
+def poster_name(url: str) -> str:
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+# Downloads every poster that isn't already in directory, a few at a time.
+# Returns where each one was saved.
+def download_posters(urls: list[str], directory: str, workers: int = 8, timeout: float = 10, retries: int = 3, backoff: float = 0.5) -> dict[str, str]:
+    os.makedirs(directory, exist_ok=True)
+    paths = {url: os.path.join(directory, poster_name(url) + '.jpg') for url in urls}
+    missing = [url for url in paths if not os.path.exists(paths[url])]
+
+    with make_session(workers, retries, backoff) as session:
+        def download(url: str):
+            response = session.get(url, timeout=timeout)
+            if response.status_code != 200:
+                raise Exception(f'Failed to download {url} ({response.status_code})')
+            # Write into a temporary file first so a half downloaded poster is never used
+            staging = paths[url] + '.part'
+            with open(staging, 'wb') as file:
+                file.write(response.content)
+            os.replace(staging, paths[url])
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(download, missing))
+    return paths
+
+# Saves a poster at each width and format, skipping any that already exist.
+# Runs in a worker process.
+def resize_poster(source: str, directory: str, widths: list[int]) -> PosterVariants:
+    variants: PosterVariants = {name: [] for name in THUMBNAIL_FORMATS}
+    name = os.path.splitext(os.path.basename(source))[0]
+    image: Optional[Image.Image] = None
+    for width in sorted(widths):
+        size = (width, round(width * POSTER_ASPECT_RATIO))
+        for extension, options in THUMBNAIL_FORMATS.items():
+            path = os.path.join(directory, f'{name}-{width}.{extension}')
+            variants[extension].append((width, path))
+            if os.path.exists(path):
+                continue
+            if image is None:
+                image = Image.open(source)
+                # Let the JPEG decoder scale down on its own, which is much
+                # faster than decoding the whole poster
+                image.draft('RGB', (max(widths), round(max(widths) * POSTER_ASPECT_RATIO)))
+                image = image.convert('RGB')
+            image.resize(size, Image.Resampling.LANCZOS).save(path, **options)
+    return variants
+
+# Downloads each poster once and resizes them in parallel, returning the
+# variants for each poster URL. Everything is kept in directory, so later runs
+# only do the work for new posters.
+def make_thumbnails(
+    urls: list[str],
+    directory: str = 'posters',
+    widths: list[int] = THUMBNAIL_WIDTHS,
+    # Processes to resize with, or None for one per CPU
+    processes: Optional[int] = None,
+    workers: int = 8,
+    timeout: float = 10,
+) -> dict[str, PosterVariants]:
+    urls = list(dict.fromkeys(urls))
+    sources = download_posters(urls, os.path.join(directory, 'originals'), workers, timeout)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        variants = executor.map(resize_poster, [sources[url] for url in urls], [directory] * len(urls), [widths] * len(urls))
+        return dict(zip(urls, variants))
@@ -0,0 +1,96 @@
+import cProfile, json, os, time
+import numpy as np
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, Optional
+
+# Set to a path to write a JSON profile report there
+PROFILE_REPORT_ENV = 'LETTERBOXD_PROFILE'
+# Set to a path to also dump cProfile stats for the render loop there
+CPROFILE_ENV = 'LETTERBOXD_CPROFILE'
+
+# Collects stage timings, counters and per-frame latencies for a run, and writes
+# them out as a JSON report. A disabled profile skips all of its bookkeeping,
+# so it can be threaded through the pipeline unconditionally.
+class Profile:
+    def __init__(self, report_file: Optional[str] = None, cprofile_file: Optional[str] = None):
+        self.report_file = report_file
+        self.cprofile_file = cprofile_file
+        self.enabled = report_file is not None
+        self.stages: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self.frame_latencies: list[float] = []
+
+    # Builds a profile that's turned on by the environment variables above
+    @classmethod
+    def from_environment(cls) -> 'Profile':
+        return cls(os.environ.get(PROFILE_REPORT_ENV), os.environ.get(CPROFILE_ENV))
+
+    # Times everything inside the block, adding to the stage's total
+    def stage(self, name: str):
+        if not self.enabled:
+            return nullcontext()
+        return self._timed_stage(name)
+
+    @contextmanager
+    def _timed_stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - start
+
+    # Runs cProfile over everything inside the block, if a dump file was given
+    @contextmanager
+    def cprofile(self) -> Iterator[None]:
+        if not self.enabled or self.cprofile_file is None:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(self.cprofile_file)
+
+    def count(self, name: str, amount: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Wraps an iterator of frames, recording how long each one took to produce
+    # both as a latency and towards the 'render' stage
+    def time_frames(self, frames: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+        if not self.enabled:
+            yield from frames
+            return
+        while True:
+            start = time.perf_counter()
+            frame = next(frames, None)
+            if frame is None:
+                return
+            latency = time.perf_counter() - start
+            self.frame_latencies.append(latency)
+            self.stages['render'] = self.stages.get('render', 0) + latency
+            yield frame
+
+    def report(self) -> dict:
+        latencies = np.array(self.frame_latencies) * 1000
+        percentiles = {}
+        if len(latencies) > 0:
+            percentiles = {
+                'p50': float(np.percentile(latencies, 50)),
+                'p90': float(np.percentile(latencies, 90)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max()),
+            }
+        return {
+            'stage_seconds': self.stages,
+            'counters': self.counters,
+            'frame_latency_ms': percentiles,
+        }
+
+    # Writes the JSON report, if profiling is turned on
+    def write(self):
+        if self.report_file is not None:
+            with open(self.report_file, 'w') as file:
+                json.dump(self.report(), file, indent=2)
@@ -0,0 +1,96 @@
+import hashlib, json, os, tempfile, time
+from typing import TypedDict, Optional
+
+# Bump this whenever the entries below change, so old ones get ignored
+CACHE_VERSION = 1
+# The folder that responses from Letterboxd are cached in
+CACHE_DIR = os.path.join('.cache', 'letterboxd')
+
+# A cached response, with the validators it came with so it can be revalidated
+# with a conditional request once it goes stale
+class CacheEntry(TypedDict):
+    version: int
+    key: str
+    value: str # the raw HTML of a page, or a film's resolved poster URL
+    fetched_at: float # seconds since the epoch it was last fetched or revalidated
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+# An on-disk cache of responses, split into kinds (e.g. pages by URL and
+# posters by film slug) that each have their own time to live. Every entry is
+# its own JSON file, so concurrent lookups for different keys never contend.
+# Once the cache grows past max_bytes, the least recently used entries are
+# evicted.
+class WebCache:
+    def __init__(self, directory: str = CACHE_DIR, ttl_seconds: Optional[dict[str, float]] = None, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds or {}
+        self.max_bytes = max_bytes
+
+    def path(self, kind: str, key: str) -> str:
+        return os.path.join(self.directory, kind, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, kind: str, key: str) -> Optional[CacheEntry]:
+        path = self.path(kind, key)
+        try:
+            with open(path, encoding='utf-8') as file:
+                entry: CacheEntry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != CACHE_VERSION or entry.get('key') != key:
+            return None
+        # Reading an entry counts as using it, for eviction
+        os.utime(path)
+        return entry
+
+    # Whether an entry is young enough to use without asking the server
+    def is_fresh(self, kind: str, entry: CacheEntry) -> bool:
+        return time.time() - entry['fetched_at'] < self.ttl_seconds.get(kind, 0)
+
+    def put(self, kind: str, key: str, value: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        entry: CacheEntry = {
+            'version': CACHE_VERSION,
+            'key': key,
+            'value': value,
+            'fetched_at': time.time(),
+            'etag': etag,
+            'last_modified': last_modified,
+        }
+        # Write into a temporary file first so a half written entry is never read
+        path = self.path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, staging = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(entry, file)
+        os.replace(staging, path)
+
+    # Marks an entry as fresh again, after the server said it hasn't changed
+    def refresh(self, kind: str, entry: CacheEntry):
+        self.put(kind, entry['key'], entry['value'], entry['etag'], entry['last_modified'])
+
+    # Deletes the least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        evict_least_recently_used(self.directory, self.max_bytes)
+
+# Deletes the least recently modified files under directory until they fit in
+# max_bytes. Caches touch their files when they're used, so this is LRU.
+def evict_least_recently_used(directory: str, max_bytes: int):
+    files: list[tuple[float, int, str]] = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size